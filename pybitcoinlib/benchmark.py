@@ -0,0 +1,249 @@
+'''timings for the hot paths of the library.
+
+run with `python benchmark.py`, or pick benchmarks by
+name, e.g. `python benchmark.py construction`.'''
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from random import randint
+from types import SimpleNamespace
+
+from ecc import *
+from transaction import Tx, TxIn, TxOut, TxFetcher
+from script import Script, p2pkh_script, p2wpkh_script
+from hash import hash256
+from util import int_to_little_endian, SIGHASH_ALL
+
+
+# the transactions the library ships with, found from here so the benchmarks
+# run from any directory
+TX_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tx.cache')
+
+
+def timeit(func, number):
+    '''average seconds per call of func over number calls'''
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+def report(title, results, unit="us"):
+    print(title)
+    scale = 1e6 if unit == "us" else 1
+    for name, value in results.items():
+        print("    {:<44} {:>12.1f} {}".format(name, value * scale, unit))
+
+
+class ValidatedPoint(Point):
+    '''a Point whose group law builds every result with the validating constructor'''
+
+    @classmethod
+    def _trusted(cls, x, y, a, b):
+        return cls(x, y, a, b)
+
+
+def bench_construction(number=200):
+    '''the library's affine double-and-add (Point.__rmul__ and Point.__add__) over
+    secp256k1, once as it is, building every intermediate point with _trusted,
+    and once with the curve check on each of them. the difference is what
+    validation would cost per multiplication'''
+    point = randint(1, N - 1) * G
+    x, y = point.x.num, point.y.num
+    secret = randint(1, N - 1)
+    trusted = Point(point.x, point.y, point.a, point.b)
+    validated = ValidatedPoint(point.x, point.y, point.a, point.b)
+    # the two take turns and the fastest run of each counts, so noise does not
+    # land on one side only
+    runs = max(number // 10, 3)
+
+    results = {}
+    results["S256Point(x, y) (validated)"] = timeit(lambda: S256Point(x, y), number)
+    results["S256Point._trusted(x, y)"] = timeit(lambda: S256Point._trusted(x, y), number)
+    with_check, without_check = [], []
+    for _ in range(runs):
+        with_check.append(timeit(lambda: secret * validated, 1))
+        without_check.append(timeit(lambda: secret * trusted, 1))
+    results["double-and-add, validated points"] = min(with_check)
+    results["double-and-add, trusted points"] = min(without_check)
+    results["validation per multiplication"] = min(with_check) - min(without_check)
+    return results
+
+
+def bench_signing(number=50):
+    '''the default signing mode against the montgomery ladder mode, and the two
+    ways of inverting a field element'''
+    pk = PrivateKey(randint(1, N - 1))
+    z = randint(0, 2**256)
+    x = randint(1, P - 1)
+
+    results = {}
+    results["sign (fixed-base table, pow(k, -1, N))"] = timeit(lambda: pk.sign(z), number)
+    results["sign (ladder, fermat inverse)"] = timeit(lambda: pk.sign(z, ladder=True), number)
+    results["pow(x, -1, P)"] = timeit(lambda: pow(x, -1, P), number)
+    results["pow(x, P-2, P)"] = timeit(lambda: pow(x, P-2, P), number)
+    return results
+
+
+def consolidation_tx(num_inputs):
+    '''an unsigned legacy transaction spending num_inputs outputs into one'''
+    tx_ins = [TxIn(randint(0, 2**256 - 1).to_bytes(32, 'big'), i) for i in range(num_inputs)]
+    tx_outs = [TxOut(10000 * num_inputs, p2pkh_script(bytes(20)))]
+    return Tx(1, tx_ins, tx_outs, 0)
+
+def bench_sig_hash(number=1, num_inputs=500):
+    '''hashing every input of a consolidation transaction, rebuilding the preimage
+    per input against sig_hash with its shared pieces and midstates'''
+    tx = consolidation_tx(num_inputs)
+    script_code = p2pkh_script(bytes(20))
+
+    def rebuild(input_index):
+        copy = Tx(tx.version, [], tx.tx_outs, tx.locktime)
+        for i, tx_in in enumerate(tx.tx_ins):
+            script_sig = script_code if i == input_index else None
+            copy.tx_ins.append(TxIn(tx_in.prev_tx, tx_in.prev_index, script_sig, tx_in.sequence))
+        return hash256(copy.serialize() + int_to_little_endian(SIGHASH_ALL, 4))
+
+    def fresh():
+        tx._legacy_sig_hash_pieces.clear()
+        for i in range(num_inputs):
+            tx.sig_hash(i, script_code)
+
+    results = {}
+    results["rebuild per input, all {} inputs".format(num_inputs)] = timeit(
+        lambda: [rebuild(i) for i in range(num_inputs)], number)
+    results["sig_hash, all {} inputs".format(num_inputs)] = timeit(fresh, number)
+    return results
+
+
+def bench_sig_hash_bip143(number=1, num_inputs=500):
+    '''bip143 hashing of every input of a segwit consolidation transaction, with
+    hashPrevouts, hashSequence and hashOutputs cached and recomputed per input'''
+    # the outputs being spent are all in one funding transaction in the fetcher cache
+    funding = Tx(1, [], [TxOut(10000, p2wpkh_script(bytes(20)))] * num_inputs, 0)
+    TxFetcher.cache[funding.id()] = funding
+    tx = consolidation_tx(num_inputs)
+    for i, tx_in in enumerate(tx.tx_ins):
+        tx_in.prev_tx, tx_in.prev_index = funding.hash(), i
+    tx.segwit = True
+
+    def uncached():
+        for i in range(num_inputs):
+            tx._hash_prevouts = tx._hash_sequence = tx._hash_outputs = None
+            tx.sig_hash_bip143(i)
+
+    def cached():
+        tx._hash_prevouts = tx._hash_sequence = tx._hash_outputs = None
+        for i in range(num_inputs):
+            tx.sig_hash_bip143(i)
+
+    results = {}
+    try:
+        results["recomputing shared hashes, all {} inputs".format(num_inputs)] = timeit(uncached, number)
+        results["sig_hash_bip143, all {} inputs".format(num_inputs)] = timeit(cached, number)
+    finally:
+        del TxFetcher.cache[funding.id()]
+    return results
+
+
+def bench_parse(number=20):
+    '''parsing the transactions of the test cache laid out back to back like a
+    block, from a stream (eager and lazy) and from the buffer'''
+    with open(TX_CACHE) as f:
+        raws = [bytes.fromhex(raw) for raw in json.load(f).values()]
+    buffer = b''.join(raws)
+
+    def from_stream():
+        stream = BytesIO(buffer)
+        for _ in raws:
+            Tx.parse(stream)
+
+    def from_stream_lazy():
+        stream = BytesIO(buffer)
+        for _ in raws:
+            Tx.parse(stream, lazy=True)
+
+    def from_buffer():
+        offset = 0
+        for _ in raws:
+            _, offset = Tx.parse_buffer(buffer, offset)
+
+    def ids(lazy):
+        stream = BytesIO(buffer)
+        for _ in raws:
+            Tx.parse(stream, lazy=lazy).id()
+
+    results = {}
+    results["Tx.parse, {} kB".format(len(buffer) // 1000)] = timeit(from_stream, number)
+    results["Tx.parse(lazy=True), {} kB".format(len(buffer) // 1000)] = timeit(from_stream_lazy, number)
+    results["Tx.parse_buffer, {} kB".format(len(buffer) // 1000)] = timeit(from_buffer, number)
+    results["Tx.parse + id()"] = timeit(lambda: ids(False), number)
+    results["Tx.parse(lazy=True) + id()"] = timeit(lambda: ids(True), number)
+    return results
+
+
+def allocated(func):
+    '''bytes still allocated by what func returns, and the result'''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+def bench_memory(number=20):
+    '''bytes per object after parsing the test cache number times over, about a
+    block's worth of transactions at the default, and what the same objects
+    cost as plain instances with a __dict__, as they were before __slots__'''
+    with open(TX_CACHE) as f:
+        raws = [bytes.fromhex(raw) for raw in json.load(f).values()] * number
+
+    results = {}
+    for lazy in (False, True):
+        size, txs = allocated(lambda: [Tx.parse(BytesIO(raw), lazy=lazy) for raw in raws])
+        results["parsed Tx{}, per tx".format(" (lazy)" if lazy else "")] = size / len(txs)
+
+    tx = txs[0]
+    tx_in, tx_out, script = tx.tx_ins[0], tx.tx_outs[0], tx.tx_outs[0].script_pubkey
+    script.cmds
+    for obj in (tx, tx_in, tx_out, script):
+        cls = obj.__class__
+        fields = {slot: getattr(obj, slot) for slot in cls.__slots__}
+        size, _ = allocated(lambda: [cls.__new__(cls) for _ in range(1000)])
+        results["{} with __slots__".format(cls.__name__)] = size / 1000
+        size, _ = allocated(lambda: [SimpleNamespace(**fields) for _ in range(1000)])
+        results["{} with a __dict__".format(cls.__name__)] = size / 1000
+    return results
+
+
+BENCHMARKS = {
+    "construction": bench_construction,
+    "signing": bench_signing,
+    "sighash": bench_sig_hash,
+    "bip143": bench_sig_hash_bip143,
+    "parse": bench_parse,
+    "memory": bench_memory,
+}
+
+
+# results worked out from other results rather than timed, which can come out
+# at or below zero when the timings are noisy
+DERIVED = {
+    "validation per multiplication",
+}
+
+# benchmarks that measure something other than time
+UNITS = {
+    "memory": "B",
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        report(name, BENCHMARKS[name](), UNITS.get(name, "us"))
@@ -0,0 +1,14 @@
+from unittest import TestCase
+
+from benchmark import *
+
+class BenchmarkTest(TestCase):
+
+    def test_benchmarks_run(self):
+        # keep every benchmark runnable, with the smallest possible workload
+        for name, bench in BENCHMARKS.items():
+            results = bench(number=1)
+            self.assertTrue(len(results) > 0, name)
+            for key, seconds in results.items():
+                if key not in DERIVED:
+                    self.assertGreater(seconds, 0, key)
@@ -1,6 +1,9 @@
 from util import *
+from transaction import Tx
 
 class Block:
+    __slots__ = ('version', 'prev_block', 'merkle_root', 'timestamp', 'bits', 'nonce', 'tx_hashes')
+
     def __init__(self, version, prev_block, merkle_root, timestamp, bits, nonce, tx_hashes=None):
         self.version = version
         self.prev_block = prev_block
@@ -21,6 +24,26 @@ class Block:
         nonce = s.read(4)
         return cls(version, prev_block, merkle_root, timestamp, bits, nonce)
 
+    @classmethod
+    def parse_full(cls, s, testnet=False):
+        '''reads a whole serialized block, the header followed by its transactions.
+        only the txids are kept, in tx_hashes; use parse and iter_txs to see
+        the transactions themselves'''
+        block = cls.parse(s)
+        for _ in block.iter_txs(s, testnet=testnet):
+            pass
+        return block
+
+    def iter_txs(self, s, testnet=False):
+        '''yields the transactions that follow the header in stream s, one at a
+        time, and records their txids in tx_hashes as it goes'''
+        self.tx_hashes = []
+        num_txs = read_varint(s)
+        for _ in range(num_txs):
+            tx = Tx.parse(s, testnet=testnet, lazy=True)
+            self.tx_hashes.append(tx.hash())
+            yield tx
+
     def serialize(self):
         result = int_to_little_endian(self.version, 4)
         result += self.prev_block[::-1]
@@ -44,6 +67,9 @@ class Block:
     def bip141(self):
         return self.version >> 1 & 1 == 1
     
+    def target(self):
+        return bits_to_target(self.bits)
+
     def difficulty(self):
         lowest = 0xffff * 256**(0x1d - 3)
         return lowest / self.target()
@@ -54,7 +80,8 @@ class Block:
         return proof < self.target()
     
     def validate_merkle_root(self):
+        '''whether tx_hashes, e.g. filled by iter_txs, commit to the merkle root'''
         # swap endianess
-        hashes = [h[::-1] for h in self.hashes]
+        hashes = [h[::-1] for h in self.tx_hashes]
         root = merkle_root(hashes)
-        return root[::-1] == self.merkle_root
\ No newline at end of file
+        return root[::-1] == self.merkle_root
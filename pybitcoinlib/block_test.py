@@ -0,0 +1,42 @@
+from unittest import TestCase
+from io import BytesIO
+from block import *
+from transaction import TxFetcher
+
+class BlockTest(TestCase):
+
+    def test_parse(self):
+        block_raw = bytes.fromhex('020000208ec39428b17323fa0ddec8e887b4a7c53b8c0a0a220cfd0000000000000000005b0750fce0a889502d40508d39576821155e9c9e3f5c3157f961db38fd8b25be1e77a759e93c0118a4ffd71d')
+        block = Block.parse(BytesIO(block_raw))
+        self.assertEqual(block.version, 0x20000002)
+        self.assertEqual(block.serialize(), block_raw)
+        self.assertEqual(block.hash().hex(), '0000000000000000007e9e4c586439b0cdbe13b1370bdd9435d76a644d047523')
+
+    def test_check_pow(self):
+        block_raw = bytes.fromhex('04000000fbedbbf0cfdaf278c094f187f2eb987c86a199da22bbb20400000000000000007b7697b29129648fa08b4bcd13c9d5e60abb973a1efac9c8d573c71c807c56c3d6213557faa80518c3737ec1')
+        block = Block.parse(BytesIO(block_raw))
+        self.assertTrue(block.check_pow())
+        block.nonce = b'\x00' * 4
+        self.assertFalse(block.check_pow())
+
+    def test_parse_full(self):
+        TxFetcher.load_cache('../tx.cache')
+        txs = list(TxFetcher.cache.values())
+        root = merkle_root([tx.hash()[::-1] for tx in txs])[::-1]
+        header = Block(0x20000002, bytes(32), root, 1500000000, bytes.fromhex('e93c0118'), bytes(4))
+        raw = header.serialize() + encode_varint(len(txs)) + b''.join(tx.serialize() for tx in txs)
+
+        block = Block.parse_full(BytesIO(raw))
+        self.assertEqual(block.tx_hashes, [tx.hash() for tx in txs])
+        self.assertTrue(block.validate_merkle_root())
+
+        # one transaction at a time, ids as they come
+        stream = BytesIO(raw)
+        block = Block.parse(stream)
+        for i, tx in enumerate(block.iter_txs(stream)):
+            self.assertEqual(tx.id(), txs[i].id())
+            self.assertEqual(len(block.tx_hashes), i + 1)
+        self.assertEqual(stream.read(), b'')
+
+        block.tx_hashes.reverse()
+        self.assertFalse(block.validate_merkle_root())
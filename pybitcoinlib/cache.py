@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    '''a bounded mapping that drops the least recently used entry when full.
+
+    safe to share between threads; hits and misses are counted on get().
+    on_evict, if given, is called with the key and value of every entry that
+    is dropped to make room, e.g. to write it back somewhere.'''
+
+    def __init__(self, maxsize=1024, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "LRUCache(size={}, maxsize={}, hits={}, misses={})".format(
+            len(self), self.maxsize, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._shrink(self.maxsize)
+
+    def resize(self, maxsize):
+        '''changes the capacity, evicting the oldest entries if it shrinks'''
+        with self._lock:
+            self.maxsize = maxsize
+            self._shrink(max(maxsize, 0))
+
+    def _shrink(self, size):
+        while len(self._data) > size:
+            key, value = self._data.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from cache import LRUCache
+
+class LRUCacheTest(TestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put(b'a', 1)
+        cache.put(b'b', 2)
+        # touching a makes b the least recently used entry
+        self.assertEqual(cache.get(b'a'), 1)
+        cache.put(b'c', 3)
+        self.assertIsNone(cache.get(b'b'))
+        self.assertEqual(cache.get(b'c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 1)
+
+    def test_resize(self):
+        cache = LRUCache(maxsize=3)
+        for i in range(3):
+            cache.put(i, i)
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertIn(2, cache)
+        cache.resize(0)
+        cache.put(4, 4)
+        self.assertEqual(len(cache), 0)
+
+    def test_on_evict(self):
+        evicted = []
+        cache = LRUCache(maxsize=2, on_evict=lambda key, value: evicted.append((key, value)))
+        for i in range(3):
+            cache.put(i, i * 10)
+        self.assertEqual(evicted, [(0, 0)])
+        cache.resize(0)
+        self.assertEqual(evicted, [(0, 0), (1, 10), (2, 20)])
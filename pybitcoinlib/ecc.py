@@ -1,14 +1,18 @@
 from hashlib import sha256
 import hmac
+import os
 from random import randint
 from io import BytesIO
 
 from base58 import *
+from cache import LRUCache
 from hash import *
 from util import *
 
 
 class FieldElement:
+    __slots__ = ("num", "prime")
+
     def __init__(self, num, prime):
         if num >= prime or num < 0:
             error = "{} is outside of the field range [0, {}]".format(num, prime-1)
@@ -50,12 +54,13 @@ class FieldElement:
 
         return self.__class__(num, self.prime)
 
-    # using fermat's little theorem
+    # pow(x, -1, p) inverts with the extended euclidean algorithm, which is much
+    # faster than fermat's little theorem (x^(p-2)) and raises on division by zero
     def __truediv__(self, other):
         if self.prime != other.prime:
             raise TypeError("Cannot divide elements from different fields by each other.")
         
-        num = (self.num * pow(other.num, self.prime-2, self.prime)) % self.prime
+        num = (self.num * pow(other.num, -1, self.prime)) % self.prime
 
         return self.__class__(num, self.prime)
 
@@ -86,6 +91,16 @@ class Point:
         if (self.y)**2 != (self.x)**3 + a*x + b:
             raise ValueError("The point ({}, {}) is not on the curve.".format(self.x, self.y))
 
+    @classmethod
+    def _trusted(cls, x, y, a, b):
+        '''builds a point produced by the group law, which is on the curve by construction'''
+        point = object.__new__(cls)
+        point.x = x
+        point.y = y
+        point.a = a
+        point.b = b
+        return point
+
     def __repr__(self):
         if self.x is None:
             return 'Point(infinity)'
@@ -129,7 +144,7 @@ class Point:
             x3 = s**2 - x1 - x2
             y3 = s * (x1 - x3) - y1
 
-            return self.__class__(x3, y3, self.a, self.b)
+            return self.__class__._trusted(x3, y3, self.a, self.b)
 
         # when P1 = P2, the line will be tangent to the curve and intersect it twice
         if (self == other):
@@ -140,7 +155,7 @@ class Point:
             x3 = s**2 - 2*x1
             y3 = s * (x1 - x3) - y1
 
-            return self.__class__(x3, y3, self.a, self.b)
+            return self.__class__._trusted(x3, y3, self.a, self.b)
 
     def __rmul__(self, coef):
         curr = self
@@ -156,26 +171,369 @@ class Point:
 
 P = 2**256 - 2**32 - 977
 class S256Field(FieldElement):
+    # the prime is fixed, so it lives on the class instead of on every element
+    __slots__ = ()
+    prime = P
+
     def __init__(self, num, prime=None):
-        super().__init__(num=num, prime=P)
+        if num >= P or num < 0:
+            error = "{} is outside of the field range [0, {}]".format(num, P-1)
+            raise ValueError(error)
+
+        self.num = num
+
+    @classmethod
+    def _trusted(cls, num):
+        '''wraps an int that is already reduced mod P, skipping the range check'''
+        element = object.__new__(cls)
+        element.num = num
+        return element
 
     def __repr__(self):
         return "{:x}".format(self.num).zfill(64)
-    
+
+    def __reduce__(self):
+        return (S256Field, (self.num,))
+
+    # results of operations between two secp256k1 elements are always in range, so they
+    # skip both the prime check and __init__. anything else goes through FieldElement.
+    def __add__(self, other):
+        if other.__class__ is not S256Field:
+            return super().__add__(other)
+        return S256Field._trusted((self.num + other.num) % P)
+
+    def __sub__(self, other):
+        if other.__class__ is not S256Field:
+            return super().__sub__(other)
+        return S256Field._trusted((self.num - other.num) % P)
+
+    def __mul__(self, other):
+        if other.__class__ is not S256Field:
+            return super().__mul__(other)
+        return S256Field._trusted(self.num * other.num % P)
+
+    def __truediv__(self, other):
+        if other.__class__ is not S256Field:
+            return super().__truediv__(other)
+        return S256Field._trusted(self.num * pow(other.num, -1, P) % P)
+
+    def __pow__(self, exp):
+        return S256Field._trusted(pow(self.num, exp % (P - 1), P))
+
+    def __rmul__(self, coef):
+        return S256Field._trusted(self.num * coef % P)
+
     def sqrt(self):
-        return self**((P + 1) // 4)
+        return S256Field._trusted(pow(self.num, (P + 1) // 4, P))
     
 A = 0
 B = 7
 N = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141
+
+# the curve constants as field elements, shared by every S256Point
+S256_A = S256Field(A)
+S256_B = S256Field(B)
+
+# jacobian coordinates: the triple (X, Y, Z) stands for the affine point (X/Z^2, Y/Z^3).
+# adding and doubling in this form needs no field inversion, so a whole scalar
+# multiplication only pays for one inversion when converting back to affine.
+# any triple with Z = 0 is the point at infinity.
+JACOBIAN_INFINITY = (1, 1, 0)
+
+def _jacobian_double(p1):
+    x1, y1, z1 = p1
+    if z1 == 0 or y1 == 0:
+        return JACOBIAN_INFINITY
+
+    # dbl-2009-l, which relies on a = 0
+    a = x1 * x1 % P
+    b = y1 * y1 % P
+    c = b * b % P
+    d = 2 * ((x1 + b) * (x1 + b) - a - c) % P
+    e = 3 * a % P
+    f = e * e % P
+
+    x3 = (f - 2 * d) % P
+    y3 = (e * (d - x3) - 8 * c) % P
+    z3 = 2 * y1 * z1 % P
+
+    return (x3, y3, z3)
+
+def _jacobian_add(p1, p2):
+    x1, y1, z1 = p1
+    x2, y2, z2 = p2
+
+    # the point at infinity is the identity
+    if z1 == 0:
+        return p2
+    if z2 == 0:
+        return p1
+
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    u1 = x1 * z2z2 % P
+    u2 = x2 * z1z1 % P
+    s1 = y1 * z2 * z2z2 % P
+    s2 = y2 * z1 * z1z1 % P
+
+    # same x: either P1 = P2 or P1 = -P2
+    if u1 == u2:
+        if s1 != s2:
+            return JACOBIAN_INFINITY
+        return _jacobian_double(p1)
+
+    h = (u2 - u1) % P
+    r = (s2 - s1) % P
+    hh = h * h % P
+    hhh = h * hh % P
+    v = u1 * hh % P
+
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - s1 * hhh) % P
+    z3 = h * z1 * z2 % P
+
+    return (x3, y3, z3)
+
+def _jacobian_add_affine(p1, x2, y2):
+    '''mixed addition of a jacobian point and an affine point (Z2 = 1)'''
+    x1, y1, z1 = p1
+    if z1 == 0:
+        return (x2, y2, 1)
+
+    z1z1 = z1 * z1 % P
+    u2 = x2 * z1z1 % P
+    s2 = y2 * z1 * z1z1 % P
+
+    if x1 == u2:
+        if y1 != s2:
+            return JACOBIAN_INFINITY
+        return _jacobian_double(p1)
+
+    h = (u2 - x1) % P
+    r = (s2 - y1) % P
+    hh = h * h % P
+    hhh = h * hh % P
+    v = x1 * hh % P
+
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - y1 * hhh) % P
+    z3 = h * z1 % P
+
+    return (x3, y3, z3)
+
+def _batch_inverse(values, prime):
+    '''montgomery's trick: inverts every (nonzero) value with a single modular inversion'''
+    prefix = []
+    acc = 1
+    for value in values:
+        prefix.append(acc)
+        acc = acc * value % prime
+
+    acc_inv = pow(acc, -1, prime)
+
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = acc_inv * prefix[i] % prime
+        acc_inv = acc_inv * values[i] % prime
+    return result
+
+def _jacobian_mul(p1, coef):
+    '''double-and-add over jacobian coordinates, most significant bit first'''
+    result = JACOBIAN_INFINITY
+    for bit in bin(coef)[2:]:
+        result = _jacobian_double(result)
+        if bit == "1":
+            result = _jacobian_add(result, p1)
+    return result
+
+def _jacobian_ladder(p1, coef, bits=256):
+    '''montgomery ladder: exactly one addition and one doubling for each of the
+    bits, whatever their value, keeping R1 - R0 = P throughout'''
+    r0 = JACOBIAN_INFINITY
+    r1 = p1
+    for i in range(bits - 1, -1, -1):
+        if (coef >> i) & 1:
+            r0 = _jacobian_add(r0, r1)
+            r1 = _jacobian_double(r1)
+        else:
+            r1 = _jacobian_add(r0, r1)
+            r0 = _jacobian_double(r0)
+    return r0
+
+WNAF_WIDTH = 5
+
+def _wnaf(coef, width):
+    '''width-w non-adjacent form of coef, least significant digit first.
+    every nonzero digit is odd and followed by at least width-1 zeros.'''
+    digits = []
+    full = 1 << width
+    half = full >> 1
+    while coef:
+        if coef & 1:
+            digit = coef & (full - 1)
+            if digit >= half:
+                digit -= full
+            coef -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        coef >>= 1
+    return digits
+
+def _odd_multiples(p1, width):
+    '''jacobian odd multiples P, 3P, 5P, ..., (2^(width-1) - 1)P used as a wNAF table'''
+    double = _jacobian_double(p1)
+    table = [p1]
+    for _ in range(2**(width - 2) - 1):
+        table.append(_jacobian_add(table[-1], double))
+    return table
+
+def _to_affine_all(points):
+    '''normalizes a list of finite jacobian points to affine (x, y) with one inversion'''
+    z_invs = _batch_inverse([z for _, _, z in points], P)
+    result = []
+    for (x, y, _), z_inv in zip(points, z_invs):
+        z_inv2 = z_inv * z_inv % P
+        result.append((x * z_inv2 % P, y * z_inv2 * z_inv % P))
+    return result
+
+# secp256k1 has an efficient endomorphism: phi(x, y) = (beta*x, y) = lambda*(x, y).
+# GLV splits a scalar k into k1 + k2*lambda with k1, k2 of about 128 bits, so k*P
+# becomes k1*P + k2*phi(P) and the chain of doublings is half as long.
+BETA = 0x7ae96a2b657c07106e64479eac3434e99cf0497512f58995c1396c28719501ee
+LAMBDA = 0x5363ad4cc05c30e0a5261c028812645a122e22ea20816678df02967c1b23bd72
+# short basis of the lattice {(a, b) : a + b*lambda = 0 mod n}
+GLV_A1 = 0x3086d221a7d46bcde86c90e49284eb15
+GLV_B1 = -0xe4437ed6010e88286f547fa90abfe4c3
+GLV_A2 = 0x114ca50f7a8e2f3f657c1108d9d44cfd8
+GLV_B2 = 0x3086d221a7d46bcde86c90e49284eb15
+
+def _glv_split(coef):
+    '''returns (k1, k2), possibly negative, with k1 + k2*lambda = coef mod n'''
+    c1 = (GLV_B2 * coef + N // 2) // N
+    c2 = (-GLV_B1 * coef + N // 2) // N
+    k1 = coef - c1 * GLV_A1 - c2 * GLV_A2
+    k2 = -c1 * GLV_B1 - c2 * GLV_B2
+    return k1, k2
+
+def _table_variant(table, endomorphism, negate):
+    '''an affine table mapped through phi (x -> beta*x) and/or negated (y -> -y)'''
+    if endomorphism:
+        table = [(x * BETA % P, y) for x, y in table]
+    if negate:
+        table = [(x, P - y) for x, y in table]
+    return table
+
+def _jacobian_multi_mul(pairs, width=WNAF_WIDTH, glv=True):
+    '''strauss' algorithm (interleaved wNAF): computes the sum of coef * point for
+    every (coef, jacobian point) pair while sharing one chain of doublings.
+    with glv=False every scalar is used whole, which is the reference path.'''
+    return _jacobian_multi_mul_many([pairs], width, glv)[0]
+
+def _jacobian_multi_mul_many(jobs, width=WNAF_WIDTH, glv=True):
+    '''runs _jacobian_multi_mul for a list of pair lists, normalizing the wNAF tables of
+    every job to affine with a single shared inversion'''
+    prepared = []
+    pending = []
+    for pairs in jobs:
+        scalars = []
+        tables = []
+        for coef, p1 in pairs:
+            coef = coef % N
+            if coef == 0 or p1[2] == 0:
+                continue
+
+            scalars.append(coef)
+            if p1 == (G.x.num, G.y.num, 1):
+                # G has a wider table that is computed once per process, with
+                # its endomorphism and negated variants
+                tables.append((GeneratorTable.odd_window, GeneratorTable.odd_variant))
+            else:
+                tables.append((width, None))
+                pending.append(_odd_multiples(p1, width))
+        prepared.append((scalars, tables))
+
+    # normalize the remaining tables to affine at once so the main loop uses mixed additions
+    affine = _to_affine_all([p for table in pending for p in table])
+    size = 2**(width - 2)
+    normalized = iter([affine[i:i + size] for i in range(0, len(affine), size)])
+
+    results = []
+    for scalars, tables in prepared:
+        terms = []
+        for coef, (term_width, variant) in zip(scalars, tables):
+            if variant is None:
+                table = next(normalized)
+                variant = lambda endomorphism, negate, table=table: \
+                    _table_variant(table, endomorphism, negate)
+
+            if glv:
+                k1, k2 = _glv_split(coef)
+                halves = ((k1, False), (k2, True))
+            else:
+                halves = ((coef, False),)
+
+            for k, endomorphism in halves:
+                # a negative scalar multiplies the negated point instead
+                negate = k < 0
+                if negate:
+                    k = -k
+                if k:
+                    terms.append((_wnaf(k, term_width), variant(endomorphism, negate)))
+
+        length = max([len(digits) for digits, _ in terms], default=0)
+        for digits, _ in terms:
+            digits.extend([0] * (length - len(digits)))
+
+        result = JACOBIAN_INFINITY
+        for i in range(length - 1, -1, -1):
+            result = _jacobian_double(result)
+            for digits, table in terms:
+                digit = digits[i]
+                if digit > 0:
+                    x, y = table[digit >> 1]
+                    result = _jacobian_add_affine(result, x, y)
+                elif digit < 0:
+                    x, y = table[-digit >> 1]
+                    result = _jacobian_add_affine(result, x, P - y)
+        results.append(result)
+    return results
+
+def _to_jacobian(point):
+    if point.x is None:
+        return JACOBIAN_INFINITY
+    return (point.x.num, point.y.num, 1)
+
+def _from_jacobian(p1):
+    '''converts back to an affine S256Point, the only step that needs an inversion'''
+    x, y, z = p1
+    if z == 0:
+        return S256Point._trusted(None, None)
+
+    z_inv = pow(z, -1, P)
+    z_inv2 = z_inv * z_inv % P
+
+    return S256Point._trusted(x * z_inv2 % P, y * z_inv2 * z_inv % P)
+
 class S256Point(Point):
-    def __init__(self, x, y, a=None, b=None):
-        a, b = S256Field(A), S256Field(B)
+    # parsed pubkeys keyed by their SEC bytes, so repeated keys skip the square root.
+    # resize with S256Point.parse_cache.resize(n); 0 turns it off.
+    parse_cache = LRUCache(maxsize=4096)
 
+    def __init__(self, x, y, a=None, b=None):
         if type(x) == int:
-            super().__init__(x=S256Field(x), y=S256Field(y), a=a, b=b)
+            super().__init__(x=S256Field(x), y=S256Field(y), a=S256_A, b=S256_B)
         else:
-            super().__init__(x=x, y=y, a=a, b=b)
+            super().__init__(x=x, y=y, a=S256_A, b=S256_B)
+
+    @classmethod
+    def _trusted(cls, x, y, a=None, b=None):
+        '''builds a point from coordinates the group law produced, skipping the curve check.
+        user-supplied coordinates must go through S256Point() or S256Point.parse().'''
+        if type(x) == int:
+            x = S256Field._trusted(x)
+            y = S256Field._trusted(y)
+        return super()._trusted(x, y, S256_A, S256_B)
 
     def __repr__(self):
         if self.x is None:
@@ -183,74 +541,249 @@ class S256Point(Point):
         else:
             return 'S256Point({}, {})'.format(self.x, self.y)
 
+    # the group law works on raw ints and only wraps the result in S256Field
+
+    def __eq__(self, other):
+        if not isinstance(other, S256Point):
+            return super().__eq__(other)
+        if self.x is None or other.x is None:
+            return self.x is None and other.x is None
+        return self.x.num == other.x.num and self.y.num == other.y.num
+
+    def __add__(self, other):
+        if not isinstance(other, S256Point):
+            return super().__add__(other)
+        return _from_jacobian(_jacobian_add(_to_jacobian(self), _to_jacobian(other)))
+
     def __rmul__(self, coef):
         coef = coef % N
-        return super().__rmul__(coef)
-    
+        if self == G:
+            return _from_jacobian(GeneratorTable.mul(coef))
+        return _from_jacobian(_jacobian_multi_mul([(coef, _to_jacobian(self))]))
+
     def verify(self, z, sig):
-        s_inv = pow(sig.s, N-2, N)
+        # out-of-range values never verify, and s = 0 has no inverse
+        if not (0 < sig.r < N and 0 < sig.s < N):
+            return False
+
+        s_inv = pow(sig.s, -1, N)
         u = (z * s_inv) % N
         v = (sig.r * s_inv) % N
-        total = u*G + v*self
+        rx, _, rz = _jacobian_multi_mul([(u, _to_jacobian(G)), (v, _to_jacobian(self))])
+
+        if rz == 0:
+            return False
+
+        # x/z^2 == r, checked without inverting z
+        return (sig.r * rz * rz - rx) % P == 0
+
+    @classmethod
+    def multi_mul(cls, pairs):
+        '''returns the sum of coef * point for a list of (coef, point) pairs'''
+        return _from_jacobian(_jacobian_multi_mul(
+            [(coef, _to_jacobian(point)) for coef, point in pairs]))
 
-        return total.x.num == sig.r
-    
     def sec(self, compressed=True):
         '''get binary of the SEC format'''
+        x = self.x.num
+        y = self.y.num
+
         if compressed:
-            if self.y.num % 2 == 0:
-                return b"\x02" + self.x.num.to_bytes(32, "big")
+            if y % 2 == 0:
+                return b"\x02" + x.to_bytes(32, "big")
             else:
-                return b"\x03" + self.y.num.to_bytes(32, "big")
-            
-        if not compressed:
-            return b"\x04" + self.x.num.to_bytes(32, "big") + self.y.num.to_bytes(32, "big")
-        
+                return b"\x03" + x.to_bytes(32, "big")
+
+        return b"\x04" + x.to_bytes(32, "big") + y.to_bytes(32, "big")
+
     @classmethod
-    def parse(self, sec_bin):
+    def parse(cls, sec_bin):
         '''returns a Point object from a SEC binary (not hex)'''
+        key = bytes(sec_bin)
+        point = cls.parse_cache.get(key)
+        if point is None:
+            point = cls.parse_uncached(key)
+            cls.parse_cache.put(key, point)
+        return point
+
+    @classmethod
+    def parse_uncached(cls, sec_bin):
+        '''parse() without looking at the cache'''
         if sec_bin[0] == 4:
             x = int.from_bytes(sec_bin[1:33], "big")
             y = int.from_bytes(sec_bin[33:65], "big")
             return S256Point(x, y)
-        
+
         is_even = (sec_bin[0] == 2)
 
-        x = S256Field(int.from_bytes(sec_bin[1:], "big"))
+        x = int.from_bytes(sec_bin[1:], "big")
+        if x >= P:
+            raise ValueError("{} is outside of the field range [0, {}]".format(x, P-1))
 
-        alpha = x**3 + S256Field(B)
-        beta = alpha.sqrt()
+        # y^2 = x^3 + 7, and p % 4 == 3 so the square root is a single exponentiation
+        alpha = (x * x * x + B) % P
+        beta = pow(alpha, (P + 1) // 4, P)
 
-        if beta.num % 2 == 0:
-            even_beta = beta
-            odd_beta = S256Field(P - beta.num)
-        if beta.num % 2 == 1:
-            even_beta = S256Field(P - beta.num)
-            odd_beta = beta
+        if (beta % 2 == 0) == is_even:
+            y = beta
+        else:
+            y = P - beta
+
+        # the constructor rejects x values that have no square root
+        return S256Point(x, y)
 
-        if is_even:
-            return S256Point(x, even_beta)
-        if not is_even:
-            return S256Point(x, odd_beta)
-        
     def hash160(self, compressed=True):
         return hash160(self.sec(compressed))
     
     def address(self, compressed=True, testnet=False):
-        h160 = self.hash160(compressed)
-
-        if testnet:
-            prefix = b"\06f"
-        if not testnet:
-            prefix = b"\x00"
-        
-        return encode_base58_checksum(prefix + h160)
+        return h160_to_p2pkh_address(self.hash160(compressed), testnet)
     
 
 G = S256Point(0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798,
               0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8)
 
 
+class GeneratorTable:
+    '''precomputed multiples of G for fixed-base multiplication.
+
+    table[i][j-1] holds j * 2^(window*i) * G in affine coordinates, so k*G is
+    one mixed addition per window of k and no doublings at all.'''
+    window = 8
+    table = None
+    # wNAF odd multiples of G for multi-scalar multiplication
+    odd_window = 8
+    odd_table = None
+    # the odd table through phi and/or negated, keyed by (endomorphism, negate)
+    odd_variants = {}
+
+    @classmethod
+    def get(cls):
+        '''returns the table, building it the first time it is needed'''
+        if cls.table is None:
+            cls.table = cls.build()
+        return cls.table
+
+    @classmethod
+    def odd_multiples(cls):
+        if cls.odd_table is None:
+            cls.odd_table = _to_affine_all(_odd_multiples(_to_jacobian(G), cls.odd_window))
+        return cls.odd_table
+
+    @classmethod
+    def odd_variant(cls, endomorphism, negate):
+        '''the odd multiples of phi(G) and/or -G, built once per process'''
+        key = (endomorphism, negate)
+        if key not in cls.odd_variants:
+            cls.odd_variants[key] = _table_variant(cls.odd_multiples(), endomorphism, negate)
+        return cls.odd_variants[key]
+
+    @classmethod
+    def build(cls):
+        size = 2**cls.window
+        num_windows = -(-256 // cls.window)
+
+        points = []
+        base = _to_jacobian(G)
+        for _ in range(num_windows):
+            current = base
+            for _ in range(1, size):
+                points.append(current)
+                current = _jacobian_add(current, base)
+            # current is now 2^window * base, the base of the next window
+            base = current
+
+        # normalize everything to affine with a single inversion
+        affine = _to_affine_all(points)
+        return [affine[i:i + size - 1] for i in range(0, len(affine), size - 1)]
+
+    @classmethod
+    def mul(cls, coef):
+        '''coef * G as a jacobian triple'''
+        table = cls.get()
+        mask = 2**cls.window - 1
+        result = JACOBIAN_INFINITY
+        i = 0
+        while coef:
+            digit = coef & mask
+            if digit:
+                x, y = table[i][digit - 1]
+                result = _jacobian_add_affine(result, x, y)
+            coef >>= cls.window
+            i += 1
+        return result
+
+    @classmethod
+    def load(cls, filename):
+        '''reads the table from disk, or builds it and saves it there if the file is missing.
+
+        the file is the points followed by the sha256 of them, and is rejected
+        if the checksum does not match'''
+        try:
+            with open(filename, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            cls.get()
+            cls.dump(filename)
+            return
+
+        size = 2**cls.window - 1
+        num_windows = -(-256 // cls.window)
+        if len(raw) != num_windows * size * 64 + 32:
+            raise ValueError("{} is not a generator table for window {}".format(filename, cls.window))
+        raw, checksum = raw[:-32], raw[-32:]
+        if sha256(raw).digest() != checksum:
+            raise ValueError("{} is corrupt, its checksum does not match".format(filename))
+
+        affine = []
+        for i in range(0, len(raw), 64):
+            affine.append((int.from_bytes(raw[i:i + 32], "big"),
+                           int.from_bytes(raw[i + 32:i + 64], "big")))
+
+        if affine[0] != (G.x.num, G.y.num):
+            raise ValueError("{} does not start with the generator point".format(filename))
+
+        cls.table = [affine[i:i + size] for i in range(0, len(affine), size)]
+
+    @classmethod
+    def dump(cls, filename):
+        raw = b''.join(x.to_bytes(32, "big") + y.to_bytes(32, "big")
+                       for window in cls.get() for x, y in window)
+        # written aside and moved over, so a crash never leaves half a table
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw + sha256(raw).digest())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+
+
+
+
+def batch_verify(items):
+    '''verifies a list of (pubkey, z, sig) triples together and returns one bool per item.
+
+    the s values are inverted with a single shared inversion, as are the wNAF
+    tables of every pubkey, and the final x == r check is done projectively so the
+    resulting points never need converting back to affine.'''
+    results = [False] * len(items)
+
+    # s must be invertible for the shared inversion, and out-of-range values never verify
+    valid = [i for i, (point, _, sig) in enumerate(items)
+             if point.x is not None and 0 < sig.r < N and 0 < sig.s < N]
+    s_invs = _batch_inverse([items[i][2].s for i in valid], N)
+
+    jobs = []
+    for i, s_inv in zip(valid, s_invs):
+        point, z, sig = items[i]
+        u = (z * s_inv) % N
+        v = (sig.r * s_inv) % N
+        jobs.append([(u, _to_jacobian(G)), (v, _to_jacobian(point))])
+
+    for i, (rx, _, rz) in zip(valid, _jacobian_multi_mul_many(jobs)):
+        r = items[i][2].r
+        results[i] = rz != 0 and (r * rz * rz - rx) % P == 0
+
+    return results
 
 
 class Signature:
@@ -279,7 +812,7 @@ class Signature:
         result_s = bytes([2, len(sbin)]) + sbin
 
         # wrap the r and s TLVs in another TLV
-        return bytes([0x30, len(rbin)+len(sbin)]) + result_r + result_s
+        return bytes([0x30, len(result_r)+len(result_s)]) + result_r + result_s
 
     @classmethod
     def parse(cls, signature_bin):
@@ -309,6 +842,42 @@ class PrivateKey:
         self.secret = secret    # private key
         self.point = secret * G # public key point
 
+    @classmethod
+    def batch_from_secrets(cls, secrets):
+        '''builds a PrivateKey for every secret, deriving the public keys together.
+
+        a secret that follows the previous one closely (secret - previous < 256, as
+        with consecutive secrets) costs one point addition instead of a multiplication,
+        and all the points share a single inversion for the affine conversion.'''
+        secrets = list(secrets)
+        step = GeneratorTable.get()[0]
+
+        points = []
+        previous, current = None, None
+        for secret in secrets:
+            delta = None if previous is None else secret - previous
+            if delta is not None and 0 < delta <= len(step) and current[2] != 0:
+                x, y = step[delta - 1]
+                current = _jacobian_add_affine(current, x, y)
+            else:
+                current = GeneratorTable.mul(secret % N)
+            points.append(current)
+            previous = secret
+
+        finite = [p for p in points if p[2] != 0]
+        affine = iter(_to_affine_all(finite))
+
+        keys = []
+        for secret, p in zip(secrets, points):
+            key = object.__new__(cls)
+            key.secret = secret
+            if p[2] == 0:
+                key.point = S256Point._trusted(None, None)
+            else:
+                key.point = S256Point._trusted(*next(affine))
+            keys.append(key)
+        return keys
+
     def hex(self):
         return "{:x}".format(self.secret).zfill(64)
     
@@ -336,17 +905,26 @@ class PrivateKey:
             v = hmac.new(k, v, sha256).digest()
 
     # z = sha256(message)
-    def sign(self, z):
+    def sign(self, z, ladder=False):
+        '''signs z. the default mode is the fastest one; ladder=True computes k*G with
+        a montgomery ladder and k^-1 with a fixed exponent, so the sequence of operations
+        does not depend on the nonce. python big ints are not constant-time either way,
+        so this hardens against simple timing/power analysis but is no guarantee.'''
         # k is the nonce
         k = self.deterministic_k(z)
-        r = (k*G).x.num
-        # multiplicative inverse
-        k_inv = pow(k, N-2, N)
+        if ladder:
+            r = _from_jacobian(_jacobian_ladder(_to_jacobian(G), k)).x.num
+            # multiplicative inverse by fermat, the exponent N-2 is public
+            k_inv = pow(k, N-2, N)
+        else:
+            r = (k*G).x.num
+            # multiplicative inverse
+            k_inv = pow(k, -1, N)
         s = ((z + r*self.secret) * k_inv) % N
 
         # get low-s values only to stop signature malleability
         # segwit fixes this: the signature is not used to compute the txid anymore
-        if s > N/2:
+        if s > N // 2:
             s = N - s
 
         return Signature(r, s)
@@ -367,4 +945,25 @@ class PrivateKey:
         return encode_base58_checksum(prefix + secret_bytes + suffix)
 
 
+def _derive_addresses(secrets, compressed, testnet):
+    return [key.point.address(compressed, testnet) for key in PrivateKey.batch_from_secrets(secrets)]
+
+def derive_addresses(secrets, compressed=True, testnet=False, processes=None, chunk_size=1000):
+    '''p2pkh addresses for a list of secrets, in order.
+
+    uses PrivateKey.batch_from_secrets, so runs of consecutive secrets are cheap.
+    with processes > 1 the secrets are split into contiguous chunks of chunk_size
+    that are derived in a process pool.'''
+    secrets = list(secrets)
+    if not processes or processes <= 1 or len(secrets) <= chunk_size:
+        return _derive_addresses(secrets, compressed, testnet)
+
+    from concurrent.futures import ProcessPoolExecutor
 
+    chunks = [secrets[i:i + chunk_size] for i in range(0, len(secrets), chunk_size)]
+    addresses = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for result in executor.map(_derive_addresses, chunks,
+                                   [compressed] * len(chunks), [testnet] * len(chunks)):
+            addresses.extend(result)
+    return addresses
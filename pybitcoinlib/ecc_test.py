@@ -1,6 +1,9 @@
+import os
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 from ecc import *
+from ecc import _glv_split, _jacobian_mul, _jacobian_multi_mul, _to_jacobian, _from_jacobian
 
 class FieldElementTest(TestCase): 
     def test_ne(self):
@@ -32,6 +35,26 @@ class FieldElementTest(TestCase):
         self.assertEqual(a / b, FieldElement(3, 19))
 
 
+class S256FieldTest(TestCase):
+    def test_fast_path(self):
+        a = S256Field(P - 1)
+        b = S256Field(2)
+        self.assertEqual(a + b, S256Field(1))
+        self.assertEqual(b - a, S256Field(3))
+        self.assertEqual(a * b, S256Field(P - 2))
+        self.assertEqual((b / a) * a, b)
+        self.assertEqual(b**3, S256Field(8))
+        self.assertEqual(3 * b, S256Field(6))
+        self.assertIsInstance(a + b, S256Field)
+        self.assertFalse(hasattr(a + b, '__dict__'))
+
+    def test_mixed_fields(self):
+        with self.assertRaises(TypeError):
+            S256Field(2) + FieldElement(2, 7)
+        with self.assertRaises(ValueError):
+            S256Field(P)
+
+
 class PointTest(TestCase):
     def test_init(self):
         with self.assertRaises(ValueError):
@@ -150,6 +173,141 @@ class S256Test(TestCase):
         r = 0xeff69ef2b1bd93a66ed5219add4fb51e11a840f404876325a1e8ffe0529a2c
         s = 0xc7207fee197d27c618aea621406f6bf5ef6fca38681d82b2f06fddbdce6feab6
         self.assertTrue(point.verify(z, Signature(r, s)))
+        self.assertFalse(point.verify(z + 1, Signature(r, s)))
+
+    def test_sec(self):
+        coefficient = 999**3
+        uncompressed = '049d5ca49670cbe4c3bfa84c96a8c87df086c6ea6a24ba6b809c9de234496808d56fa15cc7f3d38cda98dee2419f415b7513dde1301f8643cd9245aea7f3f911f9'
+        compressed = '039d5ca49670cbe4c3bfa84c96a8c87df086c6ea6a24ba6b809c9de234496808d5'
+        point = coefficient * G
+        self.assertEqual(point.sec(compressed=False), bytes.fromhex(uncompressed))
+        self.assertEqual(point.sec(compressed=True), bytes.fromhex(compressed))
+        coefficient = 123
+        uncompressed = '04a598a8030da6d86c6bc7f2f5144ea549d28211ea58faa70ebf4c1e665c1fe9b5204b5d6f84822c307e4b4a7140737aec23fc63b65b35f86a10026dbd2d864e6b'
+        compressed = '03a598a8030da6d86c6bc7f2f5144ea549d28211ea58faa70ebf4c1e665c1fe9b5'
+        point = coefficient * G
+        self.assertEqual(point.sec(compressed=False), bytes.fromhex(uncompressed))
+        self.assertEqual(point.sec(compressed=True), bytes.fromhex(compressed))
+        coefficient = 42424242
+        uncompressed = '04aee2e7d843f7430097859e2bc603abcc3274ff8169c1a469fee0f20614066f8e21ec53f40efac47ac1c5211b2123527e0e9b57ede790c4da1e72c91fb7da54a3'
+        compressed = '03aee2e7d843f7430097859e2bc603abcc3274ff8169c1a469fee0f20614066f8e'
+        point = coefficient * G
+        self.assertEqual(point.sec(compressed=False), bytes.fromhex(uncompressed))
+        self.assertEqual(point.sec(compressed=True), bytes.fromhex(compressed))
+
+    def test_parse(self):
+        for _ in range(5):
+            point = randint(1, N - 1) * G
+            self.assertEqual(S256Point.parse(point.sec(compressed=True)), point)
+            self.assertEqual(S256Point.parse(point.sec(compressed=False)), point)
+
+    def test_parse_cache(self):
+        sec = (randint(1, N - 1) * G).sec()
+        hits = S256Point.parse_cache.hits
+        point = S256Point.parse(sec)
+        self.assertIs(S256Point.parse(sec), point)
+        self.assertEqual(S256Point.parse_cache.hits, hits + 1)
+        self.assertIn(sec, S256Point.parse_cache)
+
+    def test_validation(self):
+        # user-supplied coordinates are still checked, points from the group law are not
+        with self.assertRaises(ValueError):
+            S256Point(1, 1)
+        with self.assertRaises(ValueError):
+            S256Point.parse(b'\x04' + (1).to_bytes(32, 'big') * 2)
+        point = 5 * G
+        self.assertEqual(S256Point._trusted(point.x.num, point.y.num), point)
+
+    def test_jacobian_mul(self):
+        # the jacobian path must agree with the affine double-and-add of Point
+        point = 7 * G
+        for _ in range(5):
+            secret = randint(1, N - 1)
+            self.assertEqual(secret * point, Point.__rmul__(point, secret))
+
+    def test_generator_table(self):
+        # fixed-base multiplication must agree with the generic path
+        for _ in range(5):
+            secret = randint(1, N - 1)
+            self.assertEqual(secret * G, Point.__rmul__(G, secret))
+
+    def test_generator_table_dump_load(self):
+        table = GeneratorTable.get()
+        with TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'g.table')
+            GeneratorTable.dump(filename)
+            GeneratorTable.table = None
+            GeneratorTable.load(filename)
+            self.assertEqual(GeneratorTable.table, table)
+            self.assertEqual(os.listdir(directory), ['g.table'])
+
+            with open(filename, 'rb') as f:
+                raw = bytearray(f.read())
+            # a flipped bit, and a truncated file padded back to length
+            flipped = bytearray(raw)
+            flipped[1000] ^= 1
+            padded = raw[:len(raw) // 2] + bytes(len(raw) - len(raw) // 2)
+            for bad in (flipped, padded):
+                with open(filename, 'wb') as f:
+                    f.write(bad)
+                with self.assertRaises(ValueError):
+                    GeneratorTable.load(filename)
+        GeneratorTable.table = table
+
+    def test_multi_mul(self):
+        point = randint(1, N - 1) * G
+        for _ in range(5):
+            u = randint(0, N - 1)
+            v = randint(0, N - 1)
+            self.assertEqual(S256Point.multi_mul([(u, G), (v, point)]), u*G + v*point)
+        self.assertEqual(S256Point.multi_mul([(3, point), (N - 3, point)]).x, None)
+        self.assertEqual(S256Point.multi_mul([]).x, None)
+
+    def test_glv(self):
+        # the endomorphism maps G to lambda*G
+        self.assertEqual(LAMBDA * G, S256Point(BETA * G.x.num % P, G.y.num))
+        point = randint(1, N - 1) * G
+        for _ in range(10):
+            secret = randint(1, N - 1)
+            k1, k2 = _glv_split(secret)
+            self.assertEqual((k1 + k2 * LAMBDA) % N, secret)
+            self.assertLessEqual(abs(k1).bit_length(), 129)
+            self.assertLessEqual(abs(k2).bit_length(), 129)
+            # the glv path against the plain reference paths
+            glv = _jacobian_multi_mul([(secret, _to_jacobian(point))])
+            plain = _jacobian_multi_mul([(secret, _to_jacobian(point))], glv=False)
+            self.assertEqual(_from_jacobian(glv), _from_jacobian(plain))
+            self.assertEqual(_from_jacobian(glv), _from_jacobian(_jacobian_mul(_to_jacobian(point), secret)))
+
+
+class BatchVerifyTest(TestCase):
+    def test_batch_verify(self):
+        items = []
+        for _ in range(4):
+            pk = PrivateKey(randint(1, N - 1))
+            z = randint(0, 2**256)
+            items.append((pk.point, z, pk.sign(z)))
+        point, z, sig = items[1]
+        items.append((point, z + 1, sig))
+        items.append((point, z, Signature(sig.r, 0)))
+        items.append((point, z, Signature(sig.r, N + 1)))
+        self.assertEqual(batch_verify(items), [True, True, True, True, False, False, False])
+        self.assertEqual(batch_verify([]), [])
+
+
+class SignatureTest(TestCase):
+    def test_der(self):
+        testcases = (
+            (1, 2),
+            (randint(0, 2**256), randint(0, 2**255)),
+            (randint(0, 2**256), randint(0, 2**255)),
+        )
+        for r, s in testcases:
+            sig = Signature(r, s)
+            der = sig.der()
+            sig2 = Signature.parse(der)
+            self.assertEqual(sig2.r, r)
+            self.assertEqual(sig2.s, s)
 
 
 class PrivateKeyTest(TestCase):
@@ -159,6 +317,32 @@ class PrivateKeyTest(TestCase):
         sig = pk.sign(z)
         self.assertTrue(pk.point.verify(z, sig))
 
+    def test_batch_from_secrets(self):
+        secrets = [5, 6, 7, 300, 299, N, N + 1, randint(1, N - 1)]
+        keys = PrivateKey.batch_from_secrets(secrets)
+        for secret, key in zip(secrets, keys):
+            self.assertEqual(key.secret, secret)
+            self.assertEqual(key.point, PrivateKey(secret).point)
+
+    def test_derive_addresses(self):
+        secrets = list(range(2**70, 2**70 + 20))
+        for compressed in (True, False):
+            for testnet in (True, False):
+                want = [PrivateKey(s).point.address(compressed, testnet) for s in secrets]
+                self.assertEqual(derive_addresses(secrets, compressed, testnet), want)
+        want = [PrivateKey(s).point.address() for s in secrets]
+        self.assertEqual(derive_addresses(secrets, processes=2, chunk_size=7), want)
+        self.assertEqual(PrivateKey(5002).point.address(compressed=False, testnet=True), 'mmTPbXQFxboEtNRkwfh6K51jvdtHLxGeMA')
+
+    def test_sign_ladder(self):
+        pk = PrivateKey(randint(1, N - 1))
+        z = randint(0, 2**256)
+        sig = pk.sign(z, ladder=True)
+        self.assertTrue(pk.point.verify(z, sig))
+        # both modes use the same deterministic nonce
+        self.assertEqual(sig.der(), pk.sign(z).der())
+        self.assertFalse(pk.point.verify(z, Signature(sig.r, 0)))
+
         
 if __name__ == '__main__':
     TestCase.main()
\ No newline at end of file
@@ -121,6 +121,7 @@ class MerkleTree:
 
 class MerkleBlock:
     command = b'merkleblock'
+    __slots__ = ('version', 'prev_block', 'merkle_root', 'timestamp', 'bits', 'nonce', 'total', 'hashes', 'flags')
 
     def __init__(self, version, prev_block, merkle_root, timestamp, bits, nonce, total, hashes, flags):
         self.version = version
@@ -1,6 +1,7 @@
 import hashlib
 from ecc import S256Point, Signature
 from hash import hash160, hash256
+from sigcache import SIG_CACHE
 
 from unittest import TestCase
 
@@ -646,6 +647,24 @@ def op_hash256(stack):
     return True
 
 
+def verify_cached(point, sig, z, sec_pubkey, der_signature):
+    '''point.verify(z, sig), skipped when the signature cache has already seen it verify'''
+    if SIG_CACHE.contains(sec_pubkey, z, der_signature):
+        return True
+    if point.verify(z, sig):
+        SIG_CACHE.add(sec_pubkey, z, der_signature)
+        return True
+    return False
+
+
+def sig_hash_for(z, hash_type):
+    '''z is either the sighash itself, or a function of the signature's hash type
+    that returns it'''
+    if callable(z):
+        return z(hash_type)
+    return z
+
+
 def op_checksig(stack, z):
     # check that there are at least 2 elements on the stack
     if len(stack) < 2:
@@ -653,17 +672,22 @@ def op_checksig(stack, z):
     # the top element of the stack is the SEC pubkey
     sec_pubkey = stack.pop()
     # the next element of the stack is the DER signature
+    signature = stack.pop()
+    # an empty signature is a valid way to fail
+    if len(signature) == 0:
+        stack.append(encode_num(0))
+        return True
     # take off the last byte of the signature as that's the hash_type
-    der_signature = stack.pop()[:-1]
+    der_signature, hash_type = signature[:-1], signature[-1]
     # parse the serialized pubkey and signature into objects
     try:
         point = S256Point.parse(sec_pubkey)
         sig = Signature.parse(der_signature)
     except (ValueError, SyntaxError) as e:
         return False
-    # verify the signature using S256Point.verify()
+    # verify the signature using S256Point.verify(), unless it is already cached
     # push an encoded 1 or 0 depending on whether the signature verified
-    if point.verify(z, sig):
+    if verify_cached(point, sig, sig_hash_for(z, hash_type), sec_pubkey, der_signature):
         stack.append(encode_num(1))
     else:
         stack.append(encode_num(0))
@@ -686,32 +710,31 @@ def op_checkmultisig(stack, z):
     m = decode_num(stack.pop())
     if len(stack) < m + 1:
         return False
-    der_signatures = []
+    signatures = []
     for _ in range(m):
-        # signature is assumed to be using SIGHASH_ALL
-        der_signatures.append(stack.pop()[:-1])
+        signatures.append(stack.pop())
     # OP_CHECKMULTISIG bug
     stack.pop()
     try:
-        # parse all the points
-        points = [S256Point.parse(sec) for sec in sec_pubkeys]
-        # parse all the signatures
-        sigs = [Signature.parse(der) for der in der_signatures]
+        # parse all the points, keeping their SEC bytes for the signature cache
+        points = [(S256Point.parse(sec), sec) for sec in sec_pubkeys]
+        # parse all the signatures, each one's last byte is its hash_type
+        sigs = [(Signature.parse(sig[:-1]), sig[:-1], sig_hash_for(z, sig[-1])) for sig in signatures]
         # loop through the signatures
-        for sig in sigs:
+        for sig, der, sig_z in sigs:
             # if we have no more points, signatures are no good
             if len(points) == 0:
                 return False
             # we loop until we find the point which works with this signature
             while points:
                 # get the current point from the list of points
-                point = points.pop(0)
+                point, sec = points.pop(0)
                 # we check if this signature goes with the current point
-                if point.verify(z, sig):
+                if verify_cached(point, sig, sig_z, sec, der):
                     break
         # the signatures are valid, so push a 1 to the stack
         stack.append(encode_num(1))
-    except (ValueError, SyntaxError):
+    except (ValueError, SyntaxError, IndexError):
         return False
     return True
 
@@ -772,6 +795,22 @@ class OpTest(TestCase):
         self.assertTrue(op_checksig(stack, z))
         self.assertEqual(decode_num(stack[0]), 1)
 
+    def test_op_checksig_cached(self):
+        z = 0x7c076ff316692a3d7eb3c3bb0f8b1488cf72e1afcd929e29307032997a838a3d
+        sec = bytes.fromhex('04887387e452b8eacc4acfde10d9aaf7f6d9a0f975aabb10d006e4da568744d06c61de6d95231cd89026e286df3b6ae4a894a3378e393e93a0f45b666329a0ae34')
+        sig = bytes.fromhex('3045022000eff69ef2b1bd93a66ed5219add4fb51e11a840f404876325a1e8ffe0529a2c022100c7207fee197d27c618aea621406f6bf5ef6fca38681d82b2f06fddbdce6feab601')
+        SIG_CACHE.clear()
+        self.assertTrue(op_checksig([sig, sec], z))
+        self.assertEqual(SIG_CACHE.hits, 0)
+        stack = [sig, sec]
+        self.assertTrue(op_checksig(stack, z))
+        self.assertEqual(decode_num(stack[0]), 1)
+        self.assertEqual(SIG_CACHE.hits, 1)
+        # a different sighash is not a hit
+        stack = [sig, sec]
+        self.assertTrue(op_checksig(stack, z + 1))
+        self.assertEqual(decode_num(stack[0]), 0)
+
     def test_op_checkmultisig(self):
         z = 0xe71bfa115715d6fd33796948126f40a8cdd39f187e4afb03896795189fe1423c
         sig1 = bytes.fromhex('3045022100dc92655fe37036f47756db8102e0d7d5e28b3beb83a8fef4f5dc0559bddfb94e02205a36d4e4e6c7fcd16658c50783e00c341609977aed3ad00937bf4ee942a8993701')
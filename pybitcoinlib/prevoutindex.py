@@ -0,0 +1,126 @@
+import mmap
+import sys
+from array import array
+from struct import Struct
+
+
+MAGIC = b'PVIDX001'
+# magic, number of outputs, number of slots, offset of the slot table
+HEADER = Struct('<8sQQQ')
+# txid, vout, amount, script length; the script follows
+RECORD = Struct('<32sIQI')
+SLOT = Struct('<Q')
+
+
+def _slot_hash(txid, vout):
+    # txids are already uniformly distributed, 8 of their bytes are plenty
+    return (int.from_bytes(txid[:8], 'little') ^ (vout * 0x9e3779b97f4a7c15)) & 0xffffffffffffffff
+
+
+class PrevoutIndex:
+    '''a read-only, memory-mapped file mapping (txid, vout) to (amount, script_pubkey).
+
+    the file is the header, the output records one after the other, and an open
+    addressing hash table of record offsets (0 for an empty slot), probed
+    linearly. a lookup reads a few bytes of the mapping: nothing is parsed and
+    nothing is kept in memory. txids are bytes as in TxIn.prev_tx.
+
+    build one with PrevoutIndex.build or PrevoutIndex.build_from_txs.'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.capacity, self.table_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError('not a prevout index: {}'.format(filename))
+
+    def __repr__(self):
+        return "PrevoutIndex({!r}, size={})".format(self.filename, len(self))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, outpoint):
+        return self._find(*outpoint) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _find(self, txid, vout):
+        # offset of the record for (txid, vout), None if there is none
+        mask = self.capacity - 1
+        slot = _slot_hash(txid, vout) & mask
+        for _ in range(self.capacity):
+            offset, = SLOT.unpack_from(self._map, self.table_offset + 8 * slot)
+            if offset == 0:
+                return None
+            record_txid, record_vout, _, _ = RECORD.unpack_from(self._map, offset)
+            if record_txid == txid and record_vout == vout:
+                return offset
+            slot = (slot + 1) & mask
+        return None
+
+    def get(self, txid, vout):
+        '''(amount, raw script_pubkey) of the output, None if it is not indexed'''
+        offset = self._find(bytes(txid), vout)
+        if offset is None:
+            return None
+        _, _, amount, length = RECORD.unpack_from(self._map, offset)
+        start = offset + RECORD.size
+        return amount, self._map[start:start + length]
+
+    def close(self):
+        self._map.close()
+
+    @classmethod
+    def build(cls, filename, outputs):
+        '''writes an index of outputs, an iterable of (txid, vout, amount, raw
+        script_pubkey), to filename and opens it. the records are streamed to the
+        file; only their hashes and offsets are held in memory'''
+        hashes = array('Q')
+        offsets = array('Q')
+        with open(filename, 'wb') as f:
+            f.write(bytes(HEADER.size))
+            offset = HEADER.size
+            for txid, vout, amount, script_pubkey in outputs:
+                txid = bytes(txid)
+                record = RECORD.pack(txid, vout, amount, len(script_pubkey)) + bytes(script_pubkey)
+                f.write(record)
+                hashes.append(_slot_hash(txid, vout))
+                offsets.append(offset)
+                offset += len(record)
+
+            # at most half full, so probes stay short
+            capacity = 1
+            while capacity < 2 * len(offsets):
+                capacity *= 2
+            mask = capacity - 1
+            table = array('Q', bytes(8 * capacity))
+            for h, record_offset in zip(hashes, offsets):
+                slot = h & mask
+                while table[slot] != 0:
+                    slot = (slot + 1) & mask
+                table[slot] = record_offset
+            # the slot table is little endian on disk
+            if sys.byteorder == 'big':
+                table.byteswap()
+            table_offset = offset
+            f.write(table.tobytes())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, len(offsets), capacity, table_offset))
+        return cls(filename)
+
+    @classmethod
+    def build_from_txs(cls, filename, txs):
+        '''an index of every output of txs'''
+        def outputs():
+            for tx in txs:
+                txid = tx.hash()
+                for vout, tx_out in enumerate(tx.tx_outs):
+                    yield txid, vout, tx_out.amount, tx_out.script_pubkey.raw_serialize()
+        return cls.build(filename, outputs())
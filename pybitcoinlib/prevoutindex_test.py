@@ -0,0 +1,49 @@
+import os
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+
+from prevoutindex import *
+from transaction import TxFetcher, TxIn
+
+class PrevoutIndexTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        TxFetcher.load_cache('../tx.cache')
+
+    def test_build_get(self):
+        txs = list(TxFetcher.cache.values())
+        with TemporaryDirectory() as tmp:
+            with PrevoutIndex.build_from_txs(os.path.join(tmp, 'prevouts'), txs) as index:
+                self.assertEqual(len(index), sum(len(tx.tx_outs) for tx in txs))
+                for tx in txs:
+                    for vout, tx_out in enumerate(tx.tx_outs):
+                        amount, script_pubkey = index.get(tx.hash(), vout)
+                        self.assertEqual(amount, tx_out.amount)
+                        self.assertEqual(script_pubkey, tx_out.script_pubkey.raw_serialize())
+                    self.assertNotIn((tx.hash(), len(tx.tx_outs)), index)
+                self.assertIsNone(index.get(bytes(32), 0))
+            with PrevoutIndex.build(os.path.join(tmp, 'empty'), []) as index:
+                self.assertEqual(len(index), 0)
+                self.assertIsNone(index.get(bytes(32), 0))
+            with open(os.path.join(tmp, 'other'), 'wb') as f:
+                f.write(bytes(64))
+            with self.assertRaises(ValueError):
+                PrevoutIndex(os.path.join(tmp, 'other'))
+
+    def test_fetcher(self):
+        txid, tx = next(iter(TxFetcher.cache.items()))
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'prevouts')
+            # an index that disagrees with the cache shows which one was used
+            PrevoutIndex.build(filename, [(tx.hash(), 0, 12345, b'\x51')]).close()
+            try:
+                TxFetcher.open_prevout_index(filename)
+                tx_in = TxIn(tx.hash(), 0)
+                self.assertEqual(tx_in.value(), 12345)
+                self.assertEqual(tx_in.script_pubkey().cmds, [0x51])
+                # not in the index, so it comes from the cached transaction
+                tx_in = TxIn(tx.hash(), len(tx.tx_outs) - 1)
+                self.assertEqual(tx_in.value(), tx.tx_outs[-1].amount)
+            finally:
+                TxFetcher.close_prevout_index()
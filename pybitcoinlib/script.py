@@ -3,13 +3,47 @@ from hashlib import sha256
 
 from util import *
 from op import *
+from tracked import TrackedList, notify
 
 class Script:
+    __slots__ = ('_cmds', '_raw', '_owner')
+
     def __init__(self, cmds=None):
-        if cmds is None:
-            self.cmds = []
-        else:
-            self.cmds = cmds
+        # the TxIn or TxOut holding this script, see tracked
+        self._owner = None
+        self._raw = None
+        # a plain list until someone asks for cmds, see the property
+        self._cmds = [] if cmds is None else cmds
+
+    @classmethod
+    def from_raw(cls, raw):
+        '''a Script over its serialization, without the length prefix.
+        raw can be a memoryview slice; the cmds are only parsed on first use'''
+        script = cls.__new__(cls)
+        script._cmds = None
+        script._raw = raw
+        script._owner = None
+        return script
+
+    @property
+    def cmds(self):
+        # handed out as a TrackedList, so changes made to it in place are seen
+        cmds = self._cmds
+        if type(cmds) != TrackedList:
+            if cmds is None:
+                cmds = self.parse_cmds(self._raw)
+            cmds = self._cmds = TrackedList(cmds, self, scripts_only=True)
+        return cmds
+
+    @cmds.setter
+    def cmds(self, cmds):
+        self._cmds = cmds
+        self._changed()
+
+    def _changed(self, scripts_only=True):
+        # the raw bytes no longer match once the cmds change
+        self._raw = None
+        notify(self._owner, scripts_only)
 
     def __repr__(self):
         result = []
@@ -28,47 +62,76 @@ class Script:
         return Script(self.cmds + other.cmds)
 
     @classmethod
-    def parse(cls, s):
+    def parse(cls, s, lazy=False):
+        '''reads a script from a stream. with lazy=True only its bytes are read,
+        and the cmds are parsed the first time they are used'''
         lenght = read_varint(s)
+        raw = s.read(lenght)
+        if lazy:
+            if len(raw) != lenght:
+                raise SyntaxError("script parsing failed")
+            return cls.from_raw(raw)
+        return cls(cmds=cls.parse_cmds(raw, lenght))
+
+    @classmethod
+    def parse_buffer(cls, b, offset=0):
+        '''reads the script serialized in b at offset without copying it.
+        returns a lazy Script over a memoryview slice of b and the offset after it'''
+        lenght, offset = read_varint_buffer(b, offset)
+        end = offset + lenght
+        if end > len(b):
+            raise SyntaxError("script parsing failed")
+        return cls.from_raw(memoryview(b)[offset:end]), end
+
+    @staticmethod
+    def parse_cmds(raw, lenght=None):
+        '''the cmds of a script serialized without its length prefix'''
+        if lenght is None:
+            lenght = len(raw)
         cmds = []
         count = 0
 
         while count < lenght:
-            current = s.read(1)
+            current_byte = raw[count]
             count += 1
-            current_byte = current[0]
 
             # <elem> (size of 1 to 75 bytes)
             if current_byte >= 1 and current_byte <= 75:
                 n = current_byte
-                cmds.append(s.read(n))
+                cmds.append(bytes(raw[count:count + n]))
                 count += n
             # OP_PUSHDATA1 <elem> (size of 76 to 255 bytes)
             elif current_byte == 76:
-                data_lenght = little_endian_to_int(s.read(1))
-                cmds.append(s.read(data_lenght))
+                if count >= lenght:
+                    raise SyntaxError("script parsing failed")
+                data_lenght = raw[count]
+                cmds.append(bytes(raw[count + 1:count + 1 + data_lenght]))
                 count += data_lenght + 1
             # OP_PUSHDATA2 <elem> (size of 256 to 520 bytes)
             elif current_byte == 77:
-                data_lenght = little_endian_to_int(s.read(2))
-                cmds.append(s.read(data_lenght))
-                count += data_lenght + 1
+                data_lenght = little_endian_to_int(raw[count:count + 2])
+                cmds.append(bytes(raw[count + 2:count + 2 + data_lenght]))
+                count += data_lenght + 2
             # otherwise it's an operation and not an <elem>
             else:
                 op_code = current_byte
                 cmds.append(op_code)
 
         # lenghts must match
-        if count != lenght:
+        if count != lenght or len(raw) != lenght:
             raise SyntaxError("script parsing failed")
-        
-        return cls(cmds=cmds)
-    
+
+        return cmds
 
     def raw_serialize(self):
+        # a parsed script serializes to the bytes it came from, as long as
+        # its cmds were not changed
+        if self._raw is not None:
+            return bytes(self._raw)
+
         result = b""
 
-        for cmd in self.cmds:
+        for cmd in self._cmds:
             # OP code
             if type(cmd) == int:
                 result += int_to_little_endian(cmd, 1)
@@ -76,10 +139,10 @@ class Script:
             else:
                 length = len(cmd)
 
-                if length < 75:
+                if length <= 75:
                     result += int_to_little_endian(length, 1)
 
-                elif length >= 75 and length < 256:
+                elif length > 75 and length < 256:
                     result += int_to_little_endian(76, 1) # OP_PUSHDATA1
                     result += int_to_little_endian(length, 1)
                 
@@ -151,7 +214,7 @@ class Script:
                     stream = BytesIO(redeem_script)
                     cmds.extend(Script.parse(stream).cmds)
 
-                if len(stack) == 2 and stack[0] == b"" and len(stack(1)) == 20:
+                if len(stack) == 2 and stack[0] == b"" and len(stack[1]) == 20:
                     h160 = stack.pop()
                     stack.pop()
                     cmds.extend(witness)
@@ -162,8 +225,8 @@ class Script:
                     stack.pop()
                     cmds.extend(witness[:-1])
                     witness_script = witness[-1]
-                    if s256 != sha256(witness_script):
-                        print('bad sha256 {} vs {}'.format(s256.hex(), sha256(witness_script).hex()))
+                    if s256 != sha256(witness_script).digest():
+                        print('bad sha256 {} vs {}'.format(s256.hex(), sha256(witness_script).hexdigest()))
                         return False
                     
                     stream = BytesIO(encode_varint(len(witness_script)) + witness_script)
@@ -17,6 +17,24 @@ class ScriptTest(TestCase):
         script = Script.parse(script_pubkey)
         self.assertEqual(script.serialize().hex(), want)
 
+    def test_parse_buffer(self):
+        raw = bytes.fromhex('6a47304402207899531a52d59a6de200179928ca900254a36b8dff8bb75f5f5d71b1cdc26125022008b422690b8461cb52c3cc30330b23d574351872b7c361e9aae3649071c1a7160121035d5c93d9ac96881f19ba1f686f15f009ded7c62efe85a872e6a19b43c15a2937')
+        script, offset = Script.parse_buffer(b'\x00' + raw, 1)
+        self.assertEqual(offset, len(raw) + 1)
+        self.assertEqual(script.cmds, Script.parse(BytesIO(raw)).cmds)
+        self.assertEqual(script.serialize(), raw)
+        with self.assertRaises(SyntaxError):
+            Script.parse_buffer(raw[:-1])
+        # a push that runs past the end of the script
+        with self.assertRaises(SyntaxError):
+            Script.parse_buffer(bytes.fromhex('024c05'))[0].cmds
+
+    def test_serialize_pushes(self):
+        for length in (1, 75, 76, 255, 256, 520):
+            script = Script([bytes(length), 0xac])
+            parsed = Script.parse(BytesIO(script.serialize()))
+            self.assertEqual(parsed.cmds, script.cmds)
+
     def test_address(self):
         address_1 = '1BenRpVUFK65JFWcQSuHnJKzc4M8ZP8Eqa'
         h160 = decode_base58(address_1)
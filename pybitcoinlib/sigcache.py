@@ -0,0 +1,65 @@
+import os
+import threading
+from hashlib import sha256
+
+
+class SigCache:
+    '''remembers (pubkey, sighash, signature) triples that already verified, so a
+    transaction checked in the mempool is not checked again when it shows up in a block.
+
+    like bitcoin core's signature cache:
+    - only valid signatures are stored;
+    - entries are keyed by a sha256 salted with a per-process secret, so nobody
+      can craft triples whose keys collide;
+    - memory is bounded by max_entries, and a full cache evicts an arbitrary entry.'''
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.salt = os.urandom(32)
+        self.hits = 0
+        self.misses = 0
+        self._entries = set()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "SigCache(size={}, max_entries={}, hits={}, misses={})".format(
+            len(self), self.max_entries, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, sec_pubkey, z, der_signature):
+        h = sha256(self.salt)
+        h.update(bytes(sec_pubkey))
+        h.update(z.to_bytes(32, "big"))
+        h.update(bytes(der_signature))
+        return h.digest()
+
+    def contains(self, sec_pubkey, z, der_signature):
+        key = self.key(sec_pubkey, z, der_signature)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, sec_pubkey, z, der_signature):
+        key = self.key(sec_pubkey, z, der_signature)
+        with self._lock:
+            if self.max_entries <= 0:
+                return
+            # the keys are salted hashes, so set.pop() drops an unpredictable entry
+            while len(self._entries) >= self.max_entries:
+                self._entries.pop()
+            self._entries.add(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# the cache consulted by OP_CHECKSIG and OP_CHECKMULTISIG
+SIG_CACHE = SigCache()
@@ -0,0 +1,28 @@
+from unittest import TestCase
+
+from sigcache import SigCache
+
+class SigCacheTest(TestCase):
+
+    def test_contains(self):
+        cache = SigCache()
+        sec = bytes.fromhex('0349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278a')
+        der = bytes.fromhex('3045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed')
+        z = 0x27e0c5994dec7824e56dec6b2fcb342eb7cdb0d0957c2fce9882f715e85d81a6
+        self.assertFalse(cache.contains(sec, z, der))
+        cache.add(sec, z, der)
+        self.assertTrue(cache.contains(sec, z, der))
+        self.assertFalse(cache.contains(sec, z + 1, der))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_salt(self):
+        # two caches never agree on keys, so keys cannot be precomputed
+        a, b = SigCache(), SigCache()
+        self.assertNotEqual(a.key(b'\x02', 1, b'\x30'), b.key(b'\x02', 1, b'\x30'))
+
+    def test_eviction(self):
+        cache = SigCache(max_entries=10)
+        for z in range(25):
+            cache.add(b'\x02', z, b'\x30')
+        self.assertEqual(len(cache), 10)
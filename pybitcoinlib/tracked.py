@@ -0,0 +1,135 @@
+'''back-references from scripts, inputs and outputs to the objects holding them,
+so a change made in place reaches the Tx whose caches depend on it.
+
+an owner implements _changed(scripts_only), scripts_only being True when only
+script_sigs or witnesses changed. a child held by one owner keeps a plain
+reference to it; one shared by several keeps them in a WeakSet, so copies that
+borrow it do not outlive their use.'''
+from operator import attrgetter
+from weakref import WeakSet
+
+
+def adopt(child, owner):
+    '''records owner as one of the objects holding child'''
+    current = child._owner
+    if current is None:
+        child._owner = owner
+    elif current is owner:
+        return
+    elif type(current) == WeakSet:
+        current.add(owner)
+    else:
+        # shared, e.g. the same outputs in two transactions
+        child._owner = WeakSet((current, owner))
+
+
+def notify(owner, scripts_only=False):
+    '''tells the owner, or each of the owners, of a changed object'''
+    if owner is None:
+        return
+    if type(owner) == WeakSet:
+        for o in list(owner):
+            o._changed(scripts_only)
+    else:
+        owner._changed(scripts_only)
+
+
+def tracked_field(name, scripts_only=False, adopts=False):
+    '''a property over the slot _<name>. assigning it tells the owner, and with
+    adopts the new value (a Script) is adopted by the object holding it'''
+    slot = '_' + name
+
+    def set(self, value):
+        if adopts:
+            adopt(value, self)
+        setattr(self, slot, value)
+        notify(self._owner, scripts_only)
+
+    return property(attrgetter(slot), set)
+
+
+class TrackedList(list):
+    '''a list that calls its owner's _changed when it is modified in place.
+    with owns_items, whatever is put in it is adopted by the owner too.
+
+    pickling or copying one gives a plain list.'''
+    __slots__ = ('owner', 'scripts_only', 'owns_items')
+
+    def __init__(self, items, owner, scripts_only=False, owns_items=False):
+        super().__init__(items)
+        self.owner = owner
+        self.scripts_only = scripts_only
+        self.owns_items = owns_items
+        if owns_items:
+            for item in self:
+                adopt(item, owner)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def _adopt(self, items):
+        if self.owns_items:
+            for item in items:
+                adopt(item, self.owner)
+
+    def _changed(self):
+        self.owner._changed(self.scripts_only)
+
+    def append(self, item):
+        super().append(item)
+        self._adopt((item,))
+        self._changed()
+
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        self._adopt(items)
+        self._changed()
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._adopt((item,))
+        self._changed()
+
+    def __setitem__(self, index, value):
+        if type(index) == slice:
+            value = list(value)
+            self._adopt(value)
+        else:
+            self._adopt((value,))
+        super().__setitem__(index, value)
+        self._changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._changed()
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._changed()
+        return self
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self._changed()
+        return item
+
+    def remove(self, item):
+        super().remove(item)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def sort(self, *, key=None, reverse=False):
+        super().sort(key=key, reverse=reverse)
+        self._changed()
+
+    def reverse(self):
+        super().reverse()
+        self._changed()
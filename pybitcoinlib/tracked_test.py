@@ -0,0 +1,66 @@
+import gc
+import pickle
+from unittest import TestCase
+
+from tracked import *
+
+class Owner:
+    __slots__ = ('changes', '_owner', '__weakref__')
+
+    def __init__(self):
+        self.changes = []
+        self._owner = None
+
+    def _changed(self, scripts_only):
+        self.changes.append(scripts_only)
+
+class TrackedTest(TestCase):
+
+    def test_list(self):
+        owner = Owner()
+        items = TrackedList([1, 2], owner, scripts_only=True)
+        items.append(3)
+        items[0] = 5
+        del items[1]
+        items += [4]
+        items.sort()
+        self.assertEqual(items, [3, 4, 5])
+        self.assertEqual(owner.changes, [True] * 5)
+        # copies are plain lists that hold no reference to the owner
+        self.assertEqual(type(pickle.loads(pickle.dumps(items))), list)
+
+    def test_owns_items(self):
+        owner = Owner()
+        child = Owner()
+        items = TrackedList([], owner, owns_items=True)
+        items.append(child)
+        self.assertIs(child._owner, owner)
+        notify(child._owner)
+        self.assertEqual(owner.changes, [False, False])
+
+    def test_shared(self):
+        child = Owner()
+        first, second = Owner(), Owner()
+        adopt(child, first)
+        adopt(child, first)
+        self.assertIs(child._owner, first)
+        adopt(child, second)
+        notify(child._owner, True)
+        self.assertEqual(first.changes, [True])
+        self.assertEqual(second.changes, [True])
+        # a shared child does not keep its owners alive
+        del second
+        gc.collect()
+        self.assertEqual(len(child._owner), 1)
+
+    def test_field(self):
+        class Field:
+            __slots__ = ('_value', '_owner')
+            value = tracked_field('value', scripts_only=True)
+
+        owner = Owner()
+        field = Field()
+        field._owner = owner
+        field.value = 1
+        self.assertEqual(field.value, 1)
+        self.assertEqual(owner.changes, [True])
@@ -1,12 +1,28 @@
 import json
 import requests
+from hashlib import sha256
 from io import BytesIO
+from struct import error, unpack_from
 from hash import *
 from util import *
 from script import *
+from ecc import S256Point, Signature
+from sigcache import SIG_CACHE
+from txstore import TxStore
+from prevoutindex import PrevoutIndex
+from utxoset import UtxoSet
+from tracked import TrackedList, adopt, notify, tracked_field
 
 class TxFetcher:
     cache = {}
+    # the TxStore behind the in-memory cache, off until open_store or load_cache
+    # names a file. once named, it is opened again when needed after close_store
+    store_filename = None
+    store = None
+    # an optional PrevoutIndex consulted before fetching whole transactions
+    prevout_index = None
+    # an optional UtxoSet, consulted before everything else
+    utxo_set = None
 
     @classmethod
     def get_url(cls, testnet=False):
@@ -17,6 +33,11 @@ class TxFetcher:
         
     @classmethod
     def fetch(cls, txid, testnet=False, fresh=False):
+        if not fresh and txid not in cls.cache and cls.get_store() is not None:
+            tx = cls.store.get(txid, testnet=testnet)
+            if tx is not None:
+                cls.cache[txid] = tx
+
         if fresh or (txid not in cls.cache):
             url = "{}/tx/{}.hex".format(cls.get_url(testnet), txid)
             response = requests.get(url)
@@ -37,6 +58,8 @@ class TxFetcher:
                 raise ValueError("different id's: {} != {}".format(tx.id(), txid))
             
             cls.cache[txid] = tx
+            if cls.get_store() is not None:
+                cls.store.put(tx)
         
         cls.cache[txid].testnet = testnet
 
@@ -44,7 +67,13 @@ class TxFetcher:
     
     @classmethod
     def load_cache(cls, filename):
-        with open(filename, 'r') as file:
+        '''reads a JSON tx.cache into memory. a TxStore file is opened as the
+        store instead, and its transactions are only read when fetched'''
+        with open(filename, 'rb') as file:
+            if file.read(1) != b'{':
+                cls.open_store(filename)
+                return
+            file.seek(0)
             disk_cache = json.loads(file.read())
             
         for k, raw_hex in disk_cache.items():
@@ -57,6 +86,83 @@ class TxFetcher:
                 tx = Tx.parse(BytesIO(raw))
             cls.cache[k] = tx
 
+    @classmethod
+    def get_store(cls):
+        '''the TxStore behind the cache, opening it at store_filename if needed'''
+        if cls.store is None and cls.store_filename is not None:
+            cls.open_store(cls.store_filename)
+        return cls.store
+
+    @classmethod
+    def open_store(cls, filename, sync=False):
+        '''puts a TxStore at filename behind the cache. transactions are read from
+        it one at a time when first fetched, and fetched ones are appended to it'''
+        cls.close_store()
+        cls.store_filename = filename
+        cls.store = TxStore(filename, sync=sync)
+        return cls.store
+
+    @classmethod
+    def close_store(cls):
+        '''closes the store; the next fetch that needs it opens store_filename
+        again, unless store_filename is set back to None'''
+        if cls.store is not None:
+            cls.store.close()
+            cls.store = None
+
+    @classmethod
+    def dump_store(cls):
+        '''appends everything in the in-memory cache to the store, e.g. after
+        load_cache, to move a tx.cache file over'''
+        store = cls.get_store()
+        if store is None:
+            raise RuntimeError('no store to dump to, see open_store')
+        for tx in cls.cache.values():
+            store.put(tx)
+
+    @classmethod
+    def open_prevout_index(cls, filename):
+        '''points prevout lookups at a PrevoutIndex file'''
+        cls.close_prevout_index()
+        cls.prevout_index = PrevoutIndex(filename)
+        return cls.prevout_index
+
+    @classmethod
+    def close_prevout_index(cls):
+        if cls.prevout_index is not None:
+            cls.prevout_index.close()
+            cls.prevout_index = None
+
+    @classmethod
+    def open_utxo_set(cls, filename, **kwargs):
+        '''points prevout lookups at a UtxoSet file'''
+        cls.close_utxo_set()
+        cls.utxo_set = UtxoSet(filename, **kwargs)
+        return cls.utxo_set
+
+    @classmethod
+    def close_utxo_set(cls):
+        if cls.utxo_set is not None:
+            cls.utxo_set.close()
+            cls.utxo_set = None
+
+    @classmethod
+    def prevout(cls, prev_tx, prev_index, testnet=False):
+        '''(amount, script_pubkey) of an output, from the utxo set or the prevout
+        index when they have it, otherwise from the transaction that created it'''
+        if cls.utxo_set is not None:
+            found = cls.utxo_set.get(prev_tx, prev_index)
+            if found is not None:
+                amount, script_pubkey = found
+                return amount, Script.from_raw(script_pubkey)
+        if cls.prevout_index is not None:
+            found = cls.prevout_index.get(prev_tx, prev_index)
+            if found is not None:
+                amount, script_pubkey = found
+                return amount, Script.from_raw(script_pubkey)
+        tx_out = cls.fetch(prev_tx.hex(), testnet=testnet).tx_outs[prev_index]
+        return tx_out.amount, tx_out.script_pubkey
+
     @classmethod
     def dump_cache(cls, filename):
         with open(filename, 'w') as f:
@@ -65,31 +171,75 @@ class TxFetcher:
             f.write(s)
 
 class TxIn:
-    def __init__(self, prev_tx, prev_index, script_sig=None, sequence=0xffffffff):
-        self.prev_tx = prev_tx
-        self.prev_index = prev_index
+    __slots__ = ('_prev_tx', '_prev_index', '_script_sig', '_sequence', '_witness', '_owner', '__weakref__')
+
+    # assigning any of these reaches the owning Tx, see tracked. script_sig and
+    # witness changes are scripts_only, as no sighash covers them
+    prev_tx = tracked_field('prev_tx')
+    prev_index = tracked_field('prev_index')
+    script_sig = tracked_field('script_sig', scripts_only=True, adopts=True)
+    sequence = tracked_field('sequence')
+
+    def __init__(self, prev_tx, prev_index, script_sig=None, sequence=0xffffffff, witness=None):
+        # the Tx holding this input; nothing does yet, so the slots are set directly
+        self._owner = None
+        self._prev_tx = prev_tx
+        self._prev_index = prev_index
 
         if script_sig is None:
-            self.script_sig = Script()
+            script_sig = Script()
+        if script_sig._owner is None:
+            script_sig._owner = self
         else:
-            self.script_sig = script_sig
-        
-        self.sequence = sequence
-    
+            adopt(script_sig, self)
+        self._script_sig = script_sig
+
+        self._sequence = sequence
+
+        # a plain list until someone asks for it, see the property
+        self._witness = [] if witness is None else witness
+
+    def _changed(self, scripts_only):
+        notify(self._owner, scripts_only)
+
+    @property
+    def witness(self):
+        witness = self._witness
+        if type(witness) != TrackedList:
+            witness = self._witness = TrackedList(witness, self, scripts_only=True)
+        return witness
+
+    @witness.setter
+    def witness(self, witness):
+        self._witness = witness
+        notify(self._owner, True)
+
     def __repr__(self):
         return "{}:{}".format(self.prev_tx.hex(), self.prev_index)
     
     @classmethod
-    def parse(cls, stream):
+    def parse(cls, stream, lazy=False):
         '''reads a byte stream, parses it into a transaction input and returns a TxIn object'''
 
         prev_tx = stream.read(32)[::-1]
         prev_index = little_endian_to_int(stream.read(4))
-        script_sig = Script.parse(stream)
+        script_sig = Script.parse(stream, lazy=lazy)
         sequence = little_endian_to_int(stream.read(4))
 
         return cls(prev_tx, prev_index, script_sig, sequence)
-    
+
+    @classmethod
+    def parse_buffer(cls, b, offset=0):
+        '''parses a transaction input out of buffer b at offset, returning the
+        TxIn and the offset after it. the script_sig is a lazy slice of b'''
+        # prev_tx is the one copy, it is used as reversed bytes everywhere (hex, cache keys)
+        prev_tx = bytes(b[offset:offset + 32])[::-1]
+        prev_index, = unpack_from('<I', b, offset + 32)
+        script_sig, offset = Script.parse_buffer(b, offset + 36)
+        sequence, = unpack_from('<I', b, offset)
+
+        return cls(prev_tx, prev_index, script_sig, sequence), offset + 4
+
     def serialize(self):
         '''TxIn object into byte array'''
         result = self.prev_tx[::-1]
@@ -103,29 +253,51 @@ class TxIn:
         return TxFetcher.fetch(self.prev_tx.hex(), testnet=testnet)
 
     def value(self, testnet=False):
-        tx = self.fetch_tx(testnet=testnet)
-        return tx.tx_outs[self.prev_index].amount
+        return TxFetcher.prevout(self.prev_tx, self.prev_index, testnet=testnet)[0]
     
     def script_pubkey(self, testnet=False):
-        tx = self.fetch_tx(testnet=testnet)
-        return tx.tx_outs[self.prev_index].script_pubkey
+        return TxFetcher.prevout(self.prev_tx, self.prev_index, testnet=testnet)[1]
 
 class TxOut:
+    __slots__ = ('_amount', '_script_pubkey', '_owner', '__weakref__')
+
+    # every sighash covers the outputs, so these changes are never scripts_only
+    amount = tracked_field('amount')
+    script_pubkey = tracked_field('script_pubkey', adopts=True)
+
     def __init__(self, amount, script_pubkey):
-        self.amount = amount
-        self.script_pubkey = script_pubkey
+        # the Tx holding this output, see tracked
+        self._owner = None
+        self._amount = amount
+        if script_pubkey._owner is None:
+            script_pubkey._owner = self
+        else:
+            adopt(script_pubkey, self)
+        self._script_pubkey = script_pubkey
+
+    def _changed(self, scripts_only):
+        notify(self._owner)
 
     def __repr__(self):
         return "{}:{}".format(self.amount, self.script_pubkey)
     
     @classmethod
-    def parse(cls, stream):
+    def parse(cls, stream, lazy=False):
         '''reads a byte stream, parses it into a transaction output and returns a TxOut object'''
         amount = little_endian_to_int(stream.read(8))
-        script_pubkey = Script.parse(stream)
+        script_pubkey = Script.parse(stream, lazy=lazy)
 
         return cls(amount, script_pubkey)
-    
+
+    @classmethod
+    def parse_buffer(cls, b, offset=0):
+        '''parses a transaction output out of buffer b at offset, returning the
+        TxOut and the offset after it. the script_pubkey is a lazy slice of b'''
+        amount, = unpack_from('<Q', b, offset)
+        script_pubkey, offset = Script.parse_buffer(b, offset + 8)
+
+        return cls(amount, script_pubkey), offset
+
     def serialize(self):
         '''TxOut object into byte array'''
         result = int_to_little_endian(self.amount, 8)
@@ -136,17 +308,110 @@ class TxOut:
 
 class Tx:
     command = b"tx"
+    __slots__ = (
+        '_version', '_tx_ins', '_tx_outs', '_locktime', 'testnet', '_segwit',
+        # caches, see invalidate
+        '_serialized_legacy', '_serialized_segwit', '_hash', '_wtxid', '_weight',
+        '_hash_prevouts', '_hash_sequence', '_hash_outputs', '_legacy_sig_hash_pieces',
+        '__weakref__',
+    )
 
     def __init__(self, version, tx_ins, tx_outs, locktime, testnet=False, segwit=False):
-        self.version = version
-        self.tx_ins = tx_ins
-        self.tx_outs = tx_outs
-        self.locktime = locktime
+        self._version = version
+        self._tx_ins = TrackedList(tx_ins, self, owns_items=True)
+        self._tx_outs = TrackedList(tx_outs, self, owns_items=True)
+        self._locktime = locktime
         self.testnet = testnet
-        self.segwit = segwit
-        self._hash_prevouts = None
-        self._hash_sequence = None
-        self._hash_outputs = None
+        self._segwit = segwit
+        self.invalidate()
+
+    @classmethod
+    def _parsed(cls, version, tx_ins, tx_outs, locktime, testnet, segwit):
+        # inputs and outputs fresh from the parser can only be reached through
+        # the tx_ins and tx_outs properties, so they are adopted there, once
+        # someone asks for them
+        tx = cls.__new__(cls)
+        tx._version = version
+        tx._tx_ins = tx_ins
+        tx._tx_outs = tx_outs
+        tx._locktime = locktime
+        tx.testnet = testnet
+        tx._segwit = segwit
+        tx.invalidate()
+        return tx
+
+    def invalidate(self, scripts_only=False):
+        '''drops the cached serializations, hashes, sizes and sighash pieces.
+
+        this happens on its own whenever the transaction changes: assigning
+        version, tx_ins, tx_outs, locktime or segwit, changing tx_ins or tx_outs in
+        place, or changing one of their inputs, outputs, scripts or witnesses,
+        which all report back here (see tracked). scripts_only=True keeps the
+        sighash pieces, which do not cover script_sigs or witnesses.'''
+        self._serialized_legacy = None
+        self._serialized_segwit = None
+        self._hash = None
+        self._wtxid = None
+        self._weight = None
+        if not scripts_only:
+            self._hash_prevouts = None
+            self._hash_sequence = None
+            self._hash_outputs = None
+            self._legacy_sig_hash_pieces = {}
+
+    @property
+    def version(self):
+        return self._version
+
+    @version.setter
+    def version(self, version):
+        self._version = version
+        self.invalidate()
+
+    @property
+    def tx_ins(self):
+        tx_ins = self._tx_ins
+        if type(tx_ins) != TrackedList:
+            tx_ins = self._tx_ins = TrackedList(tx_ins, self, owns_items=True)
+        return tx_ins
+
+    @tx_ins.setter
+    def tx_ins(self, tx_ins):
+        self._tx_ins = TrackedList(tx_ins, self, owns_items=True)
+        self.invalidate()
+
+    @property
+    def tx_outs(self):
+        tx_outs = self._tx_outs
+        if type(tx_outs) != TrackedList:
+            tx_outs = self._tx_outs = TrackedList(tx_outs, self, owns_items=True)
+        return tx_outs
+
+    @tx_outs.setter
+    def tx_outs(self, tx_outs):
+        self._tx_outs = TrackedList(tx_outs, self, owns_items=True)
+        self.invalidate()
+
+    @property
+    def locktime(self):
+        return self._locktime
+
+    @locktime.setter
+    def locktime(self, locktime):
+        self._locktime = locktime
+        self.invalidate()
+
+    @property
+    def segwit(self):
+        return self._segwit
+
+    @segwit.setter
+    def segwit(self, segwit):
+        self._segwit = segwit
+        self.invalidate(scripts_only=True)
+
+    def _changed(self, scripts_only):
+        self.invalidate(scripts_only)
 
     def __repr__(self):
         tx_ins = ""
@@ -172,38 +437,55 @@ class Tx:
     
     def hash(self):
         '''binary hash of the legacy serialization'''
-        return hash256(self.serialize_legacy())[::-1]
+        if self._hash is None:
+            self._hash = hash256(self.serialize_legacy())[::-1]
+        return self._hash
+
+    def wtxid(self):
+        '''binary hash of the segwit serialization, the txid for a legacy transaction'''
+        if self._wtxid is None:
+            if self.segwit:
+                self._wtxid = hash256(self.serialize_segwit())[::-1]
+            else:
+                self._wtxid = self.hash()
+        return self._wtxid
+
+    def size(self):
+        '''length in bytes of the serialization, witnesses included'''
+        return len(self.serialize())
     
     @classmethod
-    def parse(cls, s, testnet=False):
+    def parse(cls, s, testnet=False, lazy=False):
+        '''with lazy=True the scripts keep their raw bytes and are only parsed
+        when their cmds are used, for callers that need ids, amounts or outpoints'''
         s.read(4)
         if s.read(1) == b"\x00":
             parse_method = cls.parse_segwit
         else:
             parse_method = cls.parse_legacy
         s.seek(-5, 1)
-        return parse_method(s, testnet=testnet)
+        return parse_method(s, testnet=testnet, lazy=lazy)
     
     @classmethod
-    def parse_legacy(cls, s, testnet=False):
+    def parse_legacy(cls, s, testnet=False, lazy=False):
         version = little_endian_to_int(s.read(4))
 
         inputs = []
         num_inputs = read_varint(s)
         for _ in range(num_inputs):
-            inputs.append(TxIn.parse(s))
+            inputs.append(TxIn.parse(s, lazy=lazy))
         
         outputs = []
         num_outputs = read_varint(s)
         for _ in range(num_outputs):
-            outputs.append(TxOut.parse(s))
+            outputs.append(TxOut.parse(s, lazy=lazy))
         
         locktime = little_endian_to_int(s.read(4))
         
-        return cls(version, inputs, outputs, locktime, testnet=testnet, segwit=False)
+        return cls._parsed(version, inputs, outputs, locktime, testnet, False)
     
     @classmethod
-    def parse_segwit(cls, s, testnet=False):
+    def parse_segwit(cls, s, testnet=False, lazy=False):
         version = little_endian_to_int(s.read(4))
 
         marker = s.read(2)
@@ -213,12 +495,12 @@ class Tx:
         inputs = []
         num_inputs = read_varint(s)
         for _ in range(num_inputs):
-            inputs.append(TxIn.parse(s))
+            inputs.append(TxIn.parse(s, lazy=lazy))
 
         outputs = []
         num_outputs = read_varint(s)
         for _ in range(num_outputs):
-            outputs.append(TxOut.parse(s))
+            outputs.append(TxOut.parse(s, lazy=lazy))
 
         for tx_in in inputs:
             items = []
@@ -229,12 +511,66 @@ class Tx:
                     items.append(0)
                 else:
                     items.append(s.read(item_len))
-                tx_in.witness = items
+                tx_in._witness = items
 
         locktime = little_endian_to_int(s.read(4))
-        return cls(version, inputs, outputs, locktime, testnet=testnet, segwit=True)
+        return cls._parsed(version, inputs, outputs, locktime, testnet, True)
+
+
+    @classmethod
+    def parse_buffer(cls, b, offset=0, testnet=False):
+        '''parses a transaction out of a buffer (bytes, bytearray, mmap...) at offset
+        without going through a stream. returns the Tx and the offset after it.
+
+        the scripts are lazy memoryview slices of b, so b stays alive as long as
+        they do, and their cmds are only parsed when used'''
+        view = memoryview(b)
+        try:
+            version, = unpack_from('<I', view, offset)
+            offset += 4
+
+            segwit = view[offset] == 0
+            if segwit:
+                if view[offset + 1] != 1:
+                    raise RuntimeError('Not a segwit transaction {}'.format(bytes(view[offset:offset + 2])))
+                offset += 2
+
+            inputs = []
+            num_inputs, offset = read_varint_buffer(view, offset)
+            for _ in range(num_inputs):
+                tx_in, offset = TxIn.parse_buffer(view, offset)
+                inputs.append(tx_in)
+
+            outputs = []
+            num_outputs, offset = read_varint_buffer(view, offset)
+            for _ in range(num_outputs):
+                tx_out, offset = TxOut.parse_buffer(view, offset)
+                outputs.append(tx_out)
+
+            if segwit:
+                for tx_in in inputs:
+                    items = []
+                    num_items, offset = read_varint_buffer(view, offset)
+                    for _ in range(num_items):
+                        item_len, offset = read_varint_buffer(view, offset)
+                        if item_len == 0:
+                            items.append(0)
+                        else:
+                            # witness items end up on the script stack, which holds bytes
+                            items.append(bytes(view[offset:offset + item_len]))
+                            offset += item_len
+                            if offset > len(view):
+                                raise SyntaxError("transaction parsing failed")
+                    tx_in._witness = items
+
+            locktime, = unpack_from('<I', view, offset)
+            offset += 4
+        except (error, IndexError):
+            # the buffer ended in the middle of the transaction
+            raise SyntaxError("transaction parsing failed")
+
+        return cls._parsed(version, inputs, outputs, locktime, testnet, segwit), offset
 
-    
     def serialize(self):
         if self.segwit:
             return self.serialize_segwit()
@@ -242,46 +578,70 @@ class Tx:
             return self.serialize_legacy()
     
     def serialize_legacy(self):
+        if self._serialized_legacy is None:
+            if self.segwit:
+                # comes out of the same pass as the segwit serialization
+                self.serialize_segwit()
+            else:
+                self._serialized_legacy = self._serialize_base()[0]
+        return self._serialized_legacy
+
+    def serialize_segwit(self):
+        if self._serialized_segwit is None:
+            legacy, body_end = self._serialize_base()
+
+            witness = b''
+            for tx_in in self._tx_ins:
+                witness += encode_varint(len(tx_in._witness))
+                for item in tx_in._witness:
+                    if type(item) == int:
+                        witness += int_to_little_endian(item, 1)
+                    else:
+                        witness += encode_varint(len(item)) + item
+
+            # version, marker and flag, inputs and outputs, witnesses, locktime
+            self._serialized_segwit = legacy[:4] + b'\x00\x01' + legacy[4:body_end] + witness + legacy[body_end:]
+            self._serialized_legacy = legacy
+        return self._serialized_segwit
+
+    def _serialize_base(self):
+        '''the legacy serialization, and the offset where its locktime starts,
+        which is where the witnesses go in the segwit serialization'''
         result = int_to_little_endian(self.version, 4)
 
-        result += encode_varint(len(self.tx_ins))
-        for tx_in in self.tx_ins:
+        # the private lists, so serializing a parsed transaction does not adopt
+        # its inputs and outputs, see _parsed
+        result += encode_varint(len(self._tx_ins))
+        for tx_in in self._tx_ins:
             result += tx_in.serialize()
 
-        result += encode_varint(len(self.tx_outs))
-        for tx_out in self.tx_outs:
+        result += encode_varint(len(self._tx_outs))
+        for tx_out in self._tx_outs:
             result += tx_out.serialize()
-        
-        result += int_to_little_endian(self.locktime, 4)
 
-        return result
-    
-    def serialize_segwit(self):
-        result = int_to_little_endian(self.version, 4)
-
-        result += b'\x00\x01'
+        body_end = len(result)
+        result += int_to_little_endian(self.locktime, 4)
 
-        result += encode_varint(len(self.tx_ins))
-        for tx_in in self.tx_ins:
-            result += tx_in.serialize()
-        
-        result += encode_varint(len(self.tx_outs))
-        for tx_out in self.tx_outs:
-            result += tx_out.serialize()
+        return result, body_end
 
-        for tx_in in self.tx_ins:
-            result += int_to_little_endian(len(tx_in.witness), 1)
-            for item in tx_in.witness:
-                if type(item) == int:
-                    result += int_to_little_endian(item, 1)
-                else:
-                    result += encode_varint(len(item)) + item
+    def weight(self):
+        '''bip141 weight, the base size counts 4 times and the witness data once'''
+        if self._weight is None:
+            base_size = len(self.serialize_legacy())
+            self._weight = 3 * base_size + len(self.serialize())
+        return self._weight
 
-        result += int_to_little_endian(self.locktime, 4)
+    def vsize(self):
+        '''virtual size, the weight in vbytes rounded up'''
+        return (self.weight() + 3) // 4
 
-        return result
+    def fee_rate(self, testnet=False):
+        '''fee in satoshis per vbyte'''
+        return self.fee(testnet=testnet) / self.vsize()
 
     def fee(self, testnet=False):
+        # not cached: the input values come from TxFetcher, the prevout index or
+        # the UTXO set, any of which can change without the transaction knowing
         input_sum, output_sum = 0, 0
 
         for tx_in in self.tx_ins:
@@ -290,41 +650,155 @@ class Tx:
         for tx_out in self.tx_outs:
             output_sum += tx_out.amount
 
-        return (input_sum - output_sum)
+        return input_sum - output_sum
 
-    def sig_hash(self, input_index, redeem_script=None):
-        s = int_to_little_endian(self.version, 4)
+    def sig_hash(self, input_index, redeem_script=None, hash_type=SIGHASH_ALL):
+        base_type = hash_type & 0x1f
+        if base_type == SIGHASH_SINGLE and input_index >= len(self.tx_outs):
+            # SIGHASH_SINGLE without a matching output signs the number 1,
+            # a bug that is part of consensus
+            return 1
 
-        s += encode_varint(len(self.tx_ins))
-        for i, tx_in in enumerate(self.tx_ins):
-            if i == input_index:
-                if redeem_script:
-                    script_sig = redeem_script
-                else:
-                    script_sig = tx_in.script_pubkey(self.testnet)
-            else:
-                script_sig = None
+        if redeem_script:
+            script_code = redeem_script
+        else:
+            script_code = self.tx_ins[input_index].script_pubkey(self.testnet)
+
+        tx_in = self.tx_ins[input_index]
+        current = tx_in.prev_tx[::-1] + int_to_little_endian(tx_in.prev_index, 4)
+        current += script_code.serialize()
+        current += int_to_little_endian(tx_in.sequence, 4)
+
+        midstates, blanks, suffix = self.legacy_sig_hash_pieces(hash_type)
+        if midstates is None:
+            # ANYONECANPAY commits to this input alone
+            h = sha256(int_to_little_endian(self.version, 4) + encode_varint(1))
+            h.update(current)
+        else:
+            # everything before this input is already hashed into its midstate
+            h = midstates[input_index].copy()
+            h.update(current)
+            # the inputs after it have empty scripts, each blank is 41 bytes
+            h.update(blanks[41 * (input_index + 1):])
+        if suffix is None:
+            # SIGHASH_SINGLE keeps the output at this index, blanking the ones before it
+            tx_out = self.tx_outs[input_index]
+            # a blank output has an amount of -1 and an empty script
+            suffix = encode_varint(input_index + 1) + (b'\xff' * 8 + b'\x00') * input_index
+            suffix += tx_out.serialize()
+            suffix += int_to_little_endian(self.locktime, 4) + int_to_little_endian(hash_type, 4)
+        h.update(suffix)
+
+        h256 = sha256(h.digest()).digest()
 
-            s += TxIn(
-                prev_tx=tx_in.prev_tx,
-                prev_index=tx_in.prev_index,
-                script_sig=script_sig,
-                sequence=tx_in.sequence,
-            ).serialize()
+        return int.from_bytes(h256, "big")
 
-        s += encode_varint(len(self.tx_outs))
-        for tx_out in self.tx_outs:
-            s += tx_out.serialize()
-        
+    def legacy_sig_hash_pieces(self, hash_type=SIGHASH_ALL):
+        '''the parts of the legacy preimage that are the same for every input
+        signed with hash_type, built once per hash type.
+
+        returns the sha256 midstate of everything before each input, the inputs
+        serialized with empty scripts, and the outputs, locktime and hash type.
+        there are no input pieces for ANYONECANPAY and no suffix for SIGHASH_SINGLE,
+        as those depend on the input.'''
+        pieces = self._legacy_sig_hash_pieces.get(hash_type)
+        if pieces is None:
+            base_type = hash_type & 0x1f
+            midstates, view, suffix = None, None, None
+            if not hash_type & SIGHASH_ANYONECANPAY:
+                # NONE and SINGLE let the other inputs change their sequence
+                blank_sequence = base_type in (SIGHASH_NONE, SIGHASH_SINGLE)
+                blanks = b''.join(
+                    tx_in.prev_tx[::-1] + int_to_little_endian(tx_in.prev_index, 4) + b'\x00'
+                    + (b'\x00' * 4 if blank_sequence else int_to_little_endian(tx_in.sequence, 4))
+                    for tx_in in self.tx_ins)
+                h = sha256(int_to_little_endian(self.version, 4))
+                h.update(encode_varint(len(self.tx_ins)))
+                midstates = []
+                view = memoryview(blanks)
+                for i in range(len(self.tx_ins)):
+                    midstates.append(h.copy())
+                    h.update(view[41 * i:41 * (i + 1)])
+            if base_type == SIGHASH_NONE:
+                suffix = encode_varint(0)
+            elif base_type != SIGHASH_SINGLE:
+                suffix = encode_varint(len(self.tx_outs))
+                suffix += b''.join(tx_out.serialize() for tx_out in self.tx_outs)
+            if suffix is not None:
+                suffix += int_to_little_endian(self.locktime, 4)
+                suffix += int_to_little_endian(hash_type, 4)
+            pieces = (midstates, view, suffix)
+            self._legacy_sig_hash_pieces[hash_type] = pieces
+        return pieces
+
+    def hash_prevouts(self):
+        if self._hash_prevouts is None:
+            all_prevouts = b''
+            all_sequence = b''
+            for tx_in in self.tx_ins:
+                all_prevouts += tx_in.prev_tx[::-1] + int_to_little_endian(tx_in.prev_index, 4)
+                all_sequence += int_to_little_endian(tx_in.sequence, 4)
+            self._hash_prevouts = hash256(all_prevouts)
+            self._hash_sequence = hash256(all_sequence)
+        return self._hash_prevouts
+
+    def hash_sequence(self):
+        if self._hash_sequence is None:
+            self.hash_prevouts()  # this should calculate self._hash_sequence
+        return self._hash_sequence
+
+    def hash_outputs(self):
+        if self._hash_outputs is None:
+            all_outputs = b''
+            for tx_out in self.tx_outs:
+                all_outputs += tx_out.serialize()
+            self._hash_outputs = hash256(all_outputs)
+        return self._hash_outputs
+
+    def sig_hash_bip143(self, input_index, redeem_script=None, witness_script=None, hash_type=SIGHASH_ALL):
+        '''Returns the integer representation of the hash that needs to get
+        signed for index input_index, using the BIP143 serialization.
+        the three hashes shared by all inputs are computed once per transaction,
+        and each hash type either uses them or zeroes them out'''
+        base_type = hash_type & 0x1f
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        tx_in = self.tx_ins[input_index]
+        s = int_to_little_endian(self.version, 4)
+        if anyone_can_pay:
+            s += b'\x00' * 32
+        else:
+            s += self.hash_prevouts()
+        if anyone_can_pay or base_type in (SIGHASH_NONE, SIGHASH_SINGLE):
+            s += b'\x00' * 32
+        else:
+            s += self.hash_sequence()
+        s += tx_in.prev_tx[::-1] + int_to_little_endian(tx_in.prev_index, 4)
+        if witness_script:
+            script_code = witness_script.serialize()
+        elif redeem_script:
+            # p2sh-p2wpkh, the redeem script is OP_0 <20-byte hash>
+            script_code = p2pkh_script(redeem_script.cmds[1]).serialize()
+        else:
+            script_code = p2pkh_script(tx_in.script_pubkey(self.testnet).cmds[1]).serialize()
+        s += script_code
+        s += int_to_little_endian(tx_in.value(self.testnet), 8)
+        s += int_to_little_endian(tx_in.sequence, 4)
+        if base_type == SIGHASH_SINGLE:
+            if input_index < len(self.tx_outs):
+                s += hash256(self.tx_outs[input_index].serialize())
+            else:
+                s += b'\x00' * 32
+        elif base_type == SIGHASH_NONE:
+            s += b'\x00' * 32
+        else:
+            s += self.hash_outputs()
         s += int_to_little_endian(self.locktime, 4)
-        s += int_to_little_endian(SIGHASH_ALL, 4)
-
-        h256 = hash256(s)
+        s += int_to_little_endian(hash_type, 4)
+        return int.from_bytes(hash256(s), 'big')
 
-        return int.from_bytes(h256, "big")
-    
-    def verify_input(self, input_index):
-        '''Returns whether the input has a valid signature'''
+    def input_script(self, input_index):
+        '''the combined script of an input, with the z and witness to evaluate it against.
+        z is a function of the hash type, as each signature picks its own'''
         # get the relevant input
         tx_in = self.tx_ins[input_index]
         # grab the previous ScriptPubKey
@@ -338,41 +812,87 @@ class Tx:
             redeem_script = Script.parse(BytesIO(raw_redeem))
             # the RedeemScript might be p2wpkh or p2wsh
             if redeem_script.is_p2wpkh_script_pubkey():
-                z = self.sig_hash_bip143(input_index, redeem_script)
+                z = lambda hash_type: self.sig_hash_bip143(input_index, redeem_script, hash_type=hash_type)
                 witness = tx_in.witness
             elif redeem_script.is_p2wsh_script_pubkey():
                 cmd = tx_in.witness[-1]
                 raw_witness = encode_varint(len(cmd)) + cmd
                 witness_script = Script.parse(BytesIO(raw_witness))
-                z = self.sig_hash_bip143(input_index, witness_script=witness_script)
+                z = lambda hash_type: self.sig_hash_bip143(
+                    input_index, witness_script=witness_script, hash_type=hash_type)
                 witness = tx_in.witness
             else:
-                z = self.sig_hash(input_index, redeem_script)
+                z = lambda hash_type: self.sig_hash(input_index, redeem_script, hash_type=hash_type)
                 witness = None
         else:
             # ScriptPubkey might be a p2wpkh or p2wsh
             if script_pubkey.is_p2wpkh_script_pubkey():
-                z = self.sig_hash_bip143(input_index)
+                z = lambda hash_type: self.sig_hash_bip143(input_index, hash_type=hash_type)
                 witness = tx_in.witness
             elif script_pubkey.is_p2wsh_script_pubkey():
                 cmd = tx_in.witness[-1]
                 raw_witness = encode_varint(len(cmd)) + cmd
                 witness_script = Script.parse(BytesIO(raw_witness))
-                z = self.sig_hash_bip143(input_index, witness_script=witness_script)
+                z = lambda hash_type: self.sig_hash_bip143(
+                    input_index, witness_script=witness_script, hash_type=hash_type)
                 witness = tx_in.witness
             else:
-                z = self.sig_hash(input_index)
+                z = lambda hash_type: self.sig_hash(input_index, hash_type=hash_type)
                 witness = None
         # combine the current ScriptSig and the previous ScriptPubKey
         combined = tx_in.script_sig + script_pubkey
+        return combined, z, witness
+
+    def verify_input(self, input_index):
+        '''Returns whether the input has a valid signature'''
+        combined, z, witness = self.input_script(input_index)
         # evaluate the combined script
         return combined.evaluate(z, witness)
+
+    def work_item(self, input_index):
+        '''a self-contained job that verifies one input without the Tx.
+
+        a p2pkh input whose pubkey matches the hash reduces to a single signature
+        check, ("sig", sec, z, der); anything else ships the whole combined
+        script, ("script", combined, zs, witness), where zs maps the hash type of
+        every signature pushed by the script or witness to its sighash.'''
+        combined, z, witness = self.input_script(input_index)
+        cmds = combined.cmds
+        if len(cmds) == 7 and type(cmds[0]) == bytes and len(cmds[0]) > 0 and type(cmds[1]) == bytes \
+                and Script(cmds[2:]).is_p2pkh_script_pubkey() and hash160(cmds[1]) == cmds[4]:
+            # <sig> <sec> OP_DUP OP_HASH160 <h160> OP_EQUALVERIFY OP_CHECKSIG
+            # drop the hash type byte like OP_CHECKSIG does
+            return ("sig", cmds[1], z(cmds[0][-1]), cmds[0][:-1])
+        zs = {}
+        for cmd in cmds + (witness or []):
+            # anything that could be a DER signature followed by a hash type
+            if type(cmd) == bytes and len(cmd) > 8 and cmd[0] == 0x30 and cmd[-1] not in zs:
+                zs[cmd[-1]] = z(cmd[-1])
+        return ("script", combined, zs, witness)
+
+    def verify_inputs(self, parallel=None, chunk_size=16):
+        '''verifies every input, returning one result per input.
+
+        stops at the first invalid input; inputs that were never checked because
+        of that come back as None. with parallel > 1 the inputs are checked in a
+        pool of that many processes.'''
+        return run_work_items([self.work_items()], parallel, chunk_size)[0]
+
+    def work_items(self):
+        return [self.work_item(i) for i in range(len(self.tx_ins))]
+
+    def verify(self, parallel=None):
+        '''the transaction spends no more than its inputs and every input is valid'''
+        if self.fee(testnet=self.testnet) < 0:
+            return False
+        return all(self.verify_inputs(parallel))
     
-    def sign_input(self, input_index, privkey):
-        z = self.sig_hash(input_index)
+    def sign_input(self, input_index, privkey, hash_type=SIGHASH_ALL):
+        z = self.sig_hash(input_index, hash_type=hash_type)
         der = privkey.sign(z).der()
-        sig = der + SIGHASH_ALL.to_bytes(1, "big")
+        sig = der + hash_type.to_bytes(1, "big")
         sec = privkey.point.sec()
+        # the input reports the new script_sig, which keeps the sighash pieces
         self.tx_ins[input_index].script_sig = Script([sig, sec])
 
         return self.verify_input(input_index)
@@ -381,7 +901,7 @@ class Tx:
         if len(self.tx_ins) != 1:
             return False
         
-        if self.tx_ins[0].prev_tx != 0x0000000000000000000000000000000000000000000000000000000000000000:
+        if self.tx_ins[0].prev_tx != bytes(32):
             return False
         
         if self.tx_ins[0].prev_index != 0xffffffff:
@@ -391,3 +911,104 @@ class Tx:
     
     def coinbase_height(self):
         return little_endian_to_int(self.tx_ins[0].script_sig.cmds[0])
+
+
+def verify_work_item(item):
+    '''runs a job made by Tx.work_item'''
+    if item[0] == "sig":
+        _, sec, z, der = item
+        try:
+            point = S256Point.parse(sec)
+            sig = Signature.parse(der)
+        except (ValueError, SyntaxError):
+            return False
+        return point.verify(z, sig)
+    _, combined, zs, witness = item
+    # a hash type that no pushed signature used cannot verify
+    return combined.evaluate(lambda hash_type: zs.get(hash_type, 0), witness)
+
+def _verify_work_items(items):
+    # runs a chunk of one transaction's jobs, stopping at the first failure
+    results = [None] * len(items)
+    for i, item in enumerate(items):
+        results[i] = verify_work_item(item)
+        if not results[i]:
+            break
+    return results
+
+def run_work_items(jobs, parallel=None, chunk_size=16):
+    '''verifies a list of jobs, one list of work items per transaction.
+
+    returns the results in the same shape. once an item fails, the rest of its
+    transaction is skipped and comes back as None. signatures already in the
+    signature cache are not checked again, and valid ones are added to it.'''
+    results = [[None] * len(items) for items in jobs]
+    pending = []
+    for j, items in enumerate(jobs):
+        for i, item in enumerate(items):
+            if item[0] == "sig" and SIG_CACHE.contains(item[1], item[2], item[3]):
+                results[j][i] = True
+            else:
+                pending.append((j, i))
+
+    def record(j, indexes, chunk_results):
+        for i, result in zip(indexes, chunk_results):
+            results[j][i] = result
+            item = jobs[j][i]
+            if result and item[0] == "sig":
+                SIG_CACHE.add(item[1], item[2], item[3])
+
+    if not parallel or parallel <= 1:
+        failed = set()
+        for j, i in pending:
+            if j in failed:
+                continue
+            record(j, [i], _verify_work_items([jobs[j][i]]))
+            if not results[j][i]:
+                failed.add(j)
+        return _truncate_failed(results)
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    # chunks never mix transactions, so a failure can cancel the rest of its own
+    chunks = []
+    for j in range(len(jobs)):
+        indexes = [i for jj, i in pending if jj == j]
+        for start in range(0, len(indexes), chunk_size):
+            chunks.append((j, indexes[start:start + chunk_size]))
+
+    with ProcessPoolExecutor(max_workers=parallel) as executor:
+        futures = {}
+        by_job = {}
+        for j, indexes in chunks:
+            future = executor.submit(_verify_work_items, [jobs[j][i] for i in indexes])
+            futures[future] = (j, indexes)
+            by_job.setdefault(j, []).append(future)
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            j, indexes = futures[future]
+            chunk_results = future.result()
+            record(j, indexes, chunk_results)
+            if not all(chunk_results):
+                for other in by_job[j]:
+                    other.cancel()
+    # a chunk that was already running when its transaction failed still reports
+    return _truncate_failed(results)
+
+def _truncate_failed(results):
+    # keep only what came before the first failure of each transaction
+    for job_results in results:
+        for i, result in enumerate(job_results):
+            if not result:
+                job_results[i + 1:] = [None] * (len(job_results) - i - 1)
+                break
+    return results
+
+def verify_many(txs, parallel=None, chunk_size=16):
+    '''Tx.verify for a list of transactions, sharing one process pool'''
+    txs = list(txs)
+    ok = [tx.fee(testnet=tx.testnet) >= 0 for tx in txs]
+    jobs = [tx.work_items() if good else [] for tx, good in zip(txs, ok)]
+    results = run_work_items(jobs, parallel, chunk_size)
+    return [good and all(job_results) for good, job_results in zip(ok, results)]
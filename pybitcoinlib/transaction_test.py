@@ -3,6 +3,7 @@
 from unittest import TestCase
 from io import BytesIO
 from transaction import *
+from ecc import PrivateKey
 
 class TxTest(TestCase):
     cache_file = '../tx.cache'
@@ -50,6 +51,114 @@ class TxTest(TestCase):
         tx = Tx.parse(stream)
         self.assertEqual(tx.locktime, 410393)
 
+    def test_parse_buffer(self):
+        raws = [tx.serialize() for tx in TxFetcher.cache.values()]
+        # several transactions back to back, like in a block
+        buffer = b''.join(raws)
+        offset = 0
+        for raw in raws:
+            want = Tx.parse(BytesIO(raw))
+            tx, offset = Tx.parse_buffer(buffer, offset)
+            self.assertEqual(tx.segwit, want.segwit)
+            self.assertEqual(tx.id(), want.id())
+            self.assertEqual(tx.serialize(), raw)
+            self.assertEqual(tx.tx_ins[0].prev_tx, want.tx_ins[0].prev_tx)
+            self.assertEqual(tx.tx_outs[0].amount, want.tx_outs[0].amount)
+        self.assertEqual(offset, len(buffer))
+        with self.assertRaises(SyntaxError):
+            Tx.parse_buffer(raws[0][:-1])
+
+    def test_parse_buffer_lazy_scripts(self):
+        raw_tx = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        tx, _ = Tx.parse_buffer(raw_tx)
+        script_pubkey = tx.tx_outs[0].script_pubkey
+        self.assertIsNone(script_pubkey._cmds)
+        self.assertIsInstance(script_pubkey._raw, memoryview)
+        self.assertEqual(script_pubkey.cmds[2].hex(), 'bc3b654dca7e56b04dca18f2566cdaf02e8d9ada')
+        self.assertTrue(tx.verify_input(0))
+        # changing the cmds in place is seen by serialize
+        script_pubkey.cmds[2] = bytes(20)
+        self.assertEqual(script_pubkey.serialize(), p2pkh_script(bytes(20)).serialize())
+
+    def test_parse_lazy(self):
+        for tx_id, want in TxFetcher.cache.items():
+            raw = want.serialize()
+            tx = Tx.parse(BytesIO(raw), lazy=True)
+            self.assertEqual(tx.id(), tx_id)
+            self.assertEqual(tx.serialize(), raw)
+            # only the raw bytes are kept until the cmds are needed
+            self.assertIsNone(tx.tx_outs[0].script_pubkey._cmds)
+            self.assertEqual(tx.tx_outs[0].script_pubkey.cmds, want.tx_outs[0].script_pubkey.cmds)
+            self.assertEqual(tx.tx_ins[0].script_sig.serialize(), want.tx_ins[0].script_sig.serialize())
+        tx.tx_outs[0].script_pubkey = p2pkh_script(bytes(20))
+        self.assertNotEqual(tx.serialize(), raw)
+
+    def test_cached_id(self):
+        raw_tx = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx_id = tx.id()
+        self.assertIs(tx.serialize(), tx.serialize())
+        self.assertEqual(tx.size(), len(raw_tx))
+        self.assertEqual(tx.wtxid(), tx.hash())
+        # assigning a field invalidates, and so does any change made in place
+        tx.locktime += 1
+        self.assertNotEqual(tx.id(), tx_id)
+        tx.locktime -= 1
+        self.assertEqual(tx.id(), tx_id)
+        tx.tx_outs[0].amount += 1
+        self.assertNotEqual(tx.id(), tx_id)
+        tx.tx_outs[0].amount -= 1
+        self.assertEqual(tx.id(), tx_id)
+        z = tx.sig_hash(0)
+        tx.tx_outs[1].script_pubkey.cmds[2] = bytes(20)
+        self.assertNotEqual(tx.id(), tx_id)
+        self.assertNotEqual(tx.sig_hash(0), z)
+        tx.tx_outs = tx.tx_outs[:1]
+        z = tx.sig_hash(0)
+        tx.tx_ins.append(TxIn(bytes(32), 0))
+        self.assertNotEqual(tx.sig_hash(0), z)
+        # a new script_sig changes the id but not what gets signed
+        tx_id, z = tx.id(), tx.sig_hash(0)
+        tx.tx_ins[0].script_sig.cmds.pop()
+        self.assertNotEqual(tx.id(), tx_id)
+        self.assertEqual(tx.sig_hash(0), z)
+        # and witnesses change the wtxid
+        tx.segwit = True
+        wtxid = tx.wtxid()
+        tx.tx_ins[1].witness.append(bytes(33))
+        self.assertNotEqual(tx.wtxid(), wtxid)
+
+    def test_weight(self):
+        raw_tx = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        self.assertEqual(tx.weight(), 4 * len(raw_tx))
+        self.assertEqual(tx.vsize(), len(raw_tx))
+        self.assertEqual(tx.wtxid(), tx.hash())
+        self.assertEqual(tx.fee_rate(), 40000 / len(raw_tx))
+        # a segwit spend: the legacy serialization comes out of the same pass
+        tx_in = TxIn(bytes(32), 0, witness=[bytes(72), bytes(33)])
+        tx = Tx(2, [tx_in], [TxOut(1000, p2wpkh_script(bytes(20)))], 0, segwit=True)
+        raw_tx = tx.serialize()
+        legacy = tx.serialize_legacy()
+        self.assertEqual(legacy, Tx(2, [tx_in], tx.tx_outs, 0)._serialize_base()[0])
+        self.assertEqual(Tx.parse(BytesIO(raw_tx)).serialize(), raw_tx)
+        witness_size = len(raw_tx) - len(legacy)
+        self.assertEqual(witness_size, 2 + 1 + 1 + 72 + 1 + 33)
+        self.assertEqual(tx.weight(), 4 * len(legacy) + witness_size)
+        self.assertEqual(tx.vsize(), (4 * len(legacy) + witness_size + 3) // 4)
+        self.assertEqual(tx.wtxid(), hash256(raw_tx)[::-1])
+        self.assertEqual(tx.hash(), hash256(legacy)[::-1])
+
+    def test_slots(self):
+        tx_in = TxIn(bytes(32), 0)
+        self.assertEqual(tx_in.witness, [])
+        with self.assertRaises(AttributeError):
+            tx_in.value_cache = 1
+        tx = Tx(1, [tx_in], [TxOut(0, Script())], 0)
+        self.assertFalse(hasattr(tx, '__dict__'))
+        self.assertFalse(hasattr(tx.tx_outs[0], '__dict__'))
+        self.assertFalse(hasattr(tx.tx_outs[0].script_pubkey, '__dict__'))
+
     def test_fee(self):
         raw_tx = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
         stream = BytesIO(raw_tx)
@@ -60,6 +169,193 @@ class TxTest(TestCase):
         tx = Tx.parse(stream)
         self.assertEqual(tx.fee(), 140500)
 
+    def test_sig_hash(self):
+        raw_tx = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        want = int('27e0c5994dec7824e56dec6b2fcb342eb7cdb0d0957c2fce9882f715e85d81a6', 16)
+        self.assertEqual(tx.sig_hash(0), want)
+
+    def test_sig_hash_many_inputs(self):
+        raw_tx = bytes.fromhex('010000000456919960ac691763688d3d3bcea9ad6ecaf875df5339e148a1fc61c6ed7a069e010000006a47304402204585bcdef85e6b1c6af5c2669d4830ff86e42dd205c0e089bc2a821657e951c002201024a10366077f87d6bce1f7100ad8cfa8a064b39d4e8fe4ea13a7b71aa8180f012102f0da57e85eec2934a82a585ea337ce2f4998b50ae699dd79f5880e253dafafb7feffffffeb8f51f4038dc17e6313cf831d4f02281c2a468bde0fafd37f1bf882729e7fd3000000006a47304402207899531a52d59a6de200179928ca900254a36b8dff8bb75f5f5d71b1cdc26125022008b422690b8461cb52c3cc30330b23d574351872b7c361e9aae3649071c1a7160121035d5c93d9ac96881f19ba1f686f15f009ded7c62efe85a872e6a19b43c15a2937feffffff567bf40595119d1bb8a3037c356efd56170b64cbcc160fb028fa10704b45d775000000006a47304402204c7c7818424c7f7911da6cddc59655a70af1cb5eaf17c69dadbfc74ffa0b662f02207599e08bc8023693ad4e9527dc42c34210f7a7d1d1ddfc8492b654a11e7620a0012102158b46fbdff65d0172b7989aec8850aa0dae49abfb84c81ae6e5b251a58ace5cfeffffffd63a5e6c16e620f86f375925b21cabaf736c779f88fd04dcad51d26690f7f345010000006a47304402200633ea0d3314bea0d95b3cd8dadb2ef79ea8331ffe1e61f762c0f6daea0fabde022029f23b3e9c30f080446150b23852028751635dcee2be669c2a1686a4b5edf304012103ffd6f4a67e94aba353a00882e563ff2722eb4cff0ad6006e86ee20dfe7520d55feffffff0251430f00000000001976a914ab0c0b2e98b1ab6dbf67d4750b0a56244948a87988ac005a6202000000001976a9143c82d7df364eb6c75be8c80df2b3eda8db57397088ac46430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        for i in range(len(tx.tx_ins)):
+            # the whole preimage built from scratch, as sig_hash used to
+            copy = Tx(tx.version, [], tx.tx_outs, tx.locktime)
+            for j, tx_in in enumerate(tx.tx_ins):
+                script_sig = tx_in.script_pubkey() if i == j else None
+                copy.tx_ins.append(TxIn(tx_in.prev_tx, tx_in.prev_index, script_sig, tx_in.sequence))
+            want = int.from_bytes(hash256(copy.serialize() + int_to_little_endian(SIGHASH_ALL, 4)), 'big')
+            self.assertEqual(tx.sig_hash(i), want)
+        redeem_script = Script([0x51])
+        copy.tx_ins[-1].script_sig = redeem_script
+        want = int.from_bytes(hash256(copy.serialize() + int_to_little_endian(SIGHASH_ALL, 4)), 'big')
+        self.assertEqual(tx.sig_hash(3, redeem_script), want)
+
+    def test_sig_hash_bip143(self):
+        # the native p2wpkh example from bip143, the second input spends
+        # 6 BTC locked to 00141d0f172a0ecb48aee1be1f2687d2963ae33f71a1
+        raw_tx = bytes.fromhex('0100000002fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f0000000000eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac11000000')
+        tx = Tx.parse(BytesIO(raw_tx))
+        script_pubkey = p2wpkh_script(bytes.fromhex('1d0f172a0ecb48aee1be1f2687d2963ae33f71a1'))
+        prev_tx = Tx(1, [], [TxOut(0, Script()), TxOut(600000000, script_pubkey)], 0)
+        prev_id = tx.tx_ins[1].prev_tx.hex()
+        TxFetcher.cache[prev_id] = prev_tx
+        try:
+            want = int('c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670', 16)
+            self.assertEqual(tx.sig_hash_bip143(1), want)
+            self.assertEqual(tx.hash_prevouts().hex(), '96b827c8483d4e9b96712b6713a7b68d6e8003a781feba36c31143470b4efd37')
+            self.assertEqual(tx.hash_sequence().hex(), '52b0a642eea2fb7ae638c36f6252b6750293dbe574a806984b8e4d8548339a3b')
+            self.assertEqual(tx.hash_outputs().hex(), '863ef3e1a92afbfdb97f31ad0fc7683ee943e9abcf2501590ff8f6551f47e5e5')
+        finally:
+            del TxFetcher.cache[prev_id]
+
+    def test_verify_p2wpkh(self):
+        private_key = PrivateKey(8675309)
+        script_pubkey = p2wpkh_script(private_key.point.hash160())
+        prev_tx = Tx(1, [], [TxOut(5000, script_pubkey)], 0)
+        prev_id = prev_tx.id()
+        TxFetcher.cache[prev_id] = prev_tx
+        try:
+            tx_in = TxIn(bytes.fromhex(prev_id), 0)
+            tx = Tx(1, [tx_in], [TxOut(4000, p2pkh_script(bytes(20)))], 0, segwit=True)
+            z = tx.sig_hash_bip143(0)
+            sig = private_key.sign(z).der() + SIGHASH_ALL.to_bytes(1, 'big')
+            tx_in.witness = [sig, private_key.point.sec()]
+            self.assertTrue(tx.verify_input(0))
+            self.assertTrue(tx.verify())
+            tx_in.witness = [sig, PrivateKey(1).point.sec()]
+            self.assertFalse(tx.verify_input(0))
+        finally:
+            del TxFetcher.cache[prev_id]
+
+    def test_sig_hash_types(self):
+        raw_tx = bytes.fromhex('010000000456919960ac691763688d3d3bcea9ad6ecaf875df5339e148a1fc61c6ed7a069e010000006a47304402204585bcdef85e6b1c6af5c2669d4830ff86e42dd205c0e089bc2a821657e951c002201024a10366077f87d6bce1f7100ad8cfa8a064b39d4e8fe4ea13a7b71aa8180f012102f0da57e85eec2934a82a585ea337ce2f4998b50ae699dd79f5880e253dafafb7feffffffeb8f51f4038dc17e6313cf831d4f02281c2a468bde0fafd37f1bf882729e7fd3000000006a47304402207899531a52d59a6de200179928ca900254a36b8dff8bb75f5f5d71b1cdc26125022008b422690b8461cb52c3cc30330b23d574351872b7c361e9aae3649071c1a7160121035d5c93d9ac96881f19ba1f686f15f009ded7c62efe85a872e6a19b43c15a2937feffffff567bf40595119d1bb8a3037c356efd56170b64cbcc160fb028fa10704b45d775000000006a47304402204c7c7818424c7f7911da6cddc59655a70af1cb5eaf17c69dadbfc74ffa0b662f02207599e08bc8023693ad4e9527dc42c34210f7a7d1d1ddfc8492b654a11e7620a0012102158b46fbdff65d0172b7989aec8850aa0dae49abfb84c81ae6e5b251a58ace5cfeffffffd63a5e6c16e620f86f375925b21cabaf736c779f88fd04dcad51d26690f7f345010000006a47304402200633ea0d3314bea0d95b3cd8dadb2ef79ea8331ffe1e61f762c0f6daea0fabde022029f23b3e9c30f080446150b23852028751635dcee2be669c2a1686a4b5edf304012103ffd6f4a67e94aba353a00882e563ff2722eb4cff0ad6006e86ee20dfe7520d55feffffff0251430f00000000001976a914ab0c0b2e98b1ab6dbf67d4750b0a56244948a87988ac005a6202000000001976a9143c82d7df364eb6c75be8c80df2b3eda8db57397088ac46430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        # drop an output so SIGHASH_SINGLE has inputs without a matching output
+        tx.tx_outs = tx.tx_outs[:1]
+        for hash_type in (SIGHASH_ALL, SIGHASH_NONE, SIGHASH_SINGLE):
+            for anyone_can_pay in (0, SIGHASH_ANYONECANPAY):
+                for i in range(len(tx.tx_ins)):
+                    want = legacy_sig_hash(tx, i, hash_type | anyone_can_pay)
+                    self.assertEqual(tx.sig_hash(i, hash_type=hash_type | anyone_can_pay), want)
+        self.assertEqual(tx.sig_hash(1, hash_type=SIGHASH_SINGLE), 1)
+
+    def test_sig_hash_bip143_types(self):
+        raw_tx = bytes.fromhex('010000000456919960ac691763688d3d3bcea9ad6ecaf875df5339e148a1fc61c6ed7a069e010000006a47304402204585bcdef85e6b1c6af5c2669d4830ff86e42dd205c0e089bc2a821657e951c002201024a10366077f87d6bce1f7100ad8cfa8a064b39d4e8fe4ea13a7b71aa8180f012102f0da57e85eec2934a82a585ea337ce2f4998b50ae699dd79f5880e253dafafb7feffffffeb8f51f4038dc17e6313cf831d4f02281c2a468bde0fafd37f1bf882729e7fd3000000006a47304402207899531a52d59a6de200179928ca900254a36b8dff8bb75f5f5d71b1cdc26125022008b422690b8461cb52c3cc30330b23d574351872b7c361e9aae3649071c1a7160121035d5c93d9ac96881f19ba1f686f15f009ded7c62efe85a872e6a19b43c15a2937feffffff567bf40595119d1bb8a3037c356efd56170b64cbcc160fb028fa10704b45d775000000006a47304402204c7c7818424c7f7911da6cddc59655a70af1cb5eaf17c69dadbfc74ffa0b662f02207599e08bc8023693ad4e9527dc42c34210f7a7d1d1ddfc8492b654a11e7620a0012102158b46fbdff65d0172b7989aec8850aa0dae49abfb84c81ae6e5b251a58ace5cfeffffffd63a5e6c16e620f86f375925b21cabaf736c779f88fd04dcad51d26690f7f345010000006a47304402200633ea0d3314bea0d95b3cd8dadb2ef79ea8331ffe1e61f762c0f6daea0fabde022029f23b3e9c30f080446150b23852028751635dcee2be669c2a1686a4b5edf304012103ffd6f4a67e94aba353a00882e563ff2722eb4cff0ad6006e86ee20dfe7520d55feffffff0251430f00000000001976a914ab0c0b2e98b1ab6dbf67d4750b0a56244948a87988ac005a6202000000001976a9143c82d7df364eb6c75be8c80df2b3eda8db57397088ac46430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx.tx_outs = tx.tx_outs[:1]
+        # pretend the inputs spend witness programs, reusing the cached amounts
+        witness_script = Script([0x51])
+        for hash_type in (SIGHASH_ALL, SIGHASH_NONE, SIGHASH_SINGLE):
+            for anyone_can_pay in (0, SIGHASH_ANYONECANPAY):
+                for i in range(len(tx.tx_ins)):
+                    want = bip143_sig_hash(tx, i, witness_script, hash_type | anyone_can_pay)
+                    got = tx.sig_hash_bip143(i, witness_script=witness_script, hash_type=hash_type | anyone_can_pay)
+                    self.assertEqual(got, want)
+
+    def test_sign_hash_types(self):
+        private_key = PrivateKey(8675309)
+        h160 = private_key.point.hash160()
+        prev_tx = Tx(1, [], [TxOut(5000, p2pkh_script(h160)) for _ in range(3)] + [TxOut(5000, p2wpkh_script(h160))], 0)
+        prev_id = prev_tx.id()
+        TxFetcher.cache[prev_id] = prev_tx
+        try:
+            tx_ins = [TxIn(bytes.fromhex(prev_id), i) for i in range(4)]
+            tx_outs = [TxOut(4000, p2pkh_script(bytes(20))), TxOut(4000, p2pkh_script(bytes(20)))]
+            tx = Tx(1, tx_ins, tx_outs, 0, segwit=True)
+            self.assertTrue(tx.sign_input(0, private_key))
+            self.assertTrue(tx.sign_input(1, private_key, SIGHASH_NONE | SIGHASH_ANYONECANPAY))
+            # no output at index 2, so this signs 1
+            self.assertTrue(tx.sign_input(2, private_key, SIGHASH_SINGLE))
+            hash_type = SIGHASH_SINGLE | SIGHASH_ANYONECANPAY
+            z = tx.sig_hash_bip143(3, hash_type=hash_type)
+            sig = private_key.sign(z).der() + hash_type.to_bytes(1, 'big')
+            tx.tx_ins[3].witness = [sig, private_key.point.sec()]
+            SIG_CACHE.clear()
+            self.assertEqual(tx.verify_inputs(), [True] * 4)
+            SIG_CACHE.clear()
+            self.assertEqual(tx.verify_inputs(parallel=2, chunk_size=1), [True] * 4)
+            # the signature commits to its hash type
+            sig = tx.tx_ins[1].script_sig.cmds[0]
+            tx.tx_ins[1].script_sig.cmds[0] = sig[:-1] + bytes([SIGHASH_ALL])
+            self.assertFalse(tx.verify_input(1))
+        finally:
+            del TxFetcher.cache[prev_id]
+
+    def test_verify(self):
+        raw_tx = bytes.fromhex('010000000456919960ac691763688d3d3bcea9ad6ecaf875df5339e148a1fc61c6ed7a069e010000006a47304402204585bcdef85e6b1c6af5c2669d4830ff86e42dd205c0e089bc2a821657e951c002201024a10366077f87d6bce1f7100ad8cfa8a064b39d4e8fe4ea13a7b71aa8180f012102f0da57e85eec2934a82a585ea337ce2f4998b50ae699dd79f5880e253dafafb7feffffffeb8f51f4038dc17e6313cf831d4f02281c2a468bde0fafd37f1bf882729e7fd3000000006a47304402207899531a52d59a6de200179928ca900254a36b8dff8bb75f5f5d71b1cdc26125022008b422690b8461cb52c3cc30330b23d574351872b7c361e9aae3649071c1a7160121035d5c93d9ac96881f19ba1f686f15f009ded7c62efe85a872e6a19b43c15a2937feffffff567bf40595119d1bb8a3037c356efd56170b64cbcc160fb028fa10704b45d775000000006a47304402204c7c7818424c7f7911da6cddc59655a70af1cb5eaf17c69dadbfc74ffa0b662f02207599e08bc8023693ad4e9527dc42c34210f7a7d1d1ddfc8492b654a11e7620a0012102158b46fbdff65d0172b7989aec8850aa0dae49abfb84c81ae6e5b251a58ace5cfeffffffd63a5e6c16e620f86f375925b21cabaf736c779f88fd04dcad51d26690f7f345010000006a47304402200633ea0d3314bea0d95b3cd8dadb2ef79ea8331ffe1e61f762c0f6daea0fabde022029f23b3e9c30f080446150b23852028751635dcee2be669c2a1686a4b5edf304012103ffd6f4a67e94aba353a00882e563ff2722eb4cff0ad6006e86ee20dfe7520d55feffffff0251430f00000000001976a914ab0c0b2e98b1ab6dbf67d4750b0a56244948a87988ac005a6202000000001976a9143c82d7df364eb6c75be8c80df2b3eda8db57397088ac46430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        self.assertEqual(tx.work_item(0)[0], "sig")
+        SIG_CACHE.clear()
+        self.assertEqual(tx.verify_inputs(), [True] * 4)
+        SIG_CACHE.clear()
+        self.assertEqual(tx.verify_inputs(parallel=2, chunk_size=1), [True] * 4)
+        self.assertTrue(tx.verify(parallel=2))
+        # paying out more than before breaks every signature; the first failure stops the rest
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx.tx_outs[0].amount += 1
+        self.assertEqual(tx.verify_inputs(), [False, None, None, None])
+        self.assertFalse(tx.verify(parallel=2))
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx.tx_outs[0].amount = 10 ** 15
+        self.assertFalse(tx.verify())
+
+    def test_verify_many(self):
+        raw_tx = bytes.fromhex('010000000456919960ac691763688d3d3bcea9ad6ecaf875df5339e148a1fc61c6ed7a069e010000006a47304402204585bcdef85e6b1c6af5c2669d4830ff86e42dd205c0e089bc2a821657e951c002201024a10366077f87d6bce1f7100ad8cfa8a064b39d4e8fe4ea13a7b71aa8180f012102f0da57e85eec2934a82a585ea337ce2f4998b50ae699dd79f5880e253dafafb7feffffffeb8f51f4038dc17e6313cf831d4f02281c2a468bde0fafd37f1bf882729e7fd3000000006a47304402207899531a52d59a6de200179928ca900254a36b8dff8bb75f5f5d71b1cdc26125022008b422690b8461cb52c3cc30330b23d574351872b7c361e9aae3649071c1a7160121035d5c93d9ac96881f19ba1f686f15f009ded7c62efe85a872e6a19b43c15a2937feffffff567bf40595119d1bb8a3037c356efd56170b64cbcc160fb028fa10704b45d775000000006a47304402204c7c7818424c7f7911da6cddc59655a70af1cb5eaf17c69dadbfc74ffa0b662f02207599e08bc8023693ad4e9527dc42c34210f7a7d1d1ddfc8492b654a11e7620a0012102158b46fbdff65d0172b7989aec8850aa0dae49abfb84c81ae6e5b251a58ace5cfeffffffd63a5e6c16e620f86f375925b21cabaf736c779f88fd04dcad51d26690f7f345010000006a47304402200633ea0d3314bea0d95b3cd8dadb2ef79ea8331ffe1e61f762c0f6daea0fabde022029f23b3e9c30f080446150b23852028751635dcee2be669c2a1686a4b5edf304012103ffd6f4a67e94aba353a00882e563ff2722eb4cff0ad6006e86ee20dfe7520d55feffffff0251430f00000000001976a914ab0c0b2e98b1ab6dbf67d4750b0a56244948a87988ac005a6202000000001976a9143c82d7df364eb6c75be8c80df2b3eda8db57397088ac46430600')
+        good = Tx.parse(BytesIO(raw_tx))
+        bad = Tx.parse(BytesIO(raw_tx))
+        bad.locktime += 1
+        SIG_CACHE.clear()
+        self.assertEqual(verify_many([good, bad, good], parallel=3, chunk_size=2), [True, False, True])
+        self.assertEqual(verify_many([bad, good]), [False, True])
+
+
+def legacy_sig_hash(tx, input_index, hash_type):
+    '''the legacy sighash built from a modified copy of the transaction'''
+    base_type = hash_type & 0x1f
+    if base_type == SIGHASH_SINGLE and input_index >= len(tx.tx_outs):
+        return 1
+    tx_ins = []
+    for i, tx_in in enumerate(tx.tx_ins):
+        if i == input_index:
+            tx_ins.append(TxIn(tx_in.prev_tx, tx_in.prev_index, tx_in.script_pubkey(), tx_in.sequence))
+        elif not hash_type & SIGHASH_ANYONECANPAY:
+            sequence = 0 if base_type in (SIGHASH_NONE, SIGHASH_SINGLE) else tx_in.sequence
+            tx_ins.append(TxIn(tx_in.prev_tx, tx_in.prev_index, None, sequence))
+    if base_type == SIGHASH_NONE:
+        tx_outs = []
+    elif base_type == SIGHASH_SINGLE:
+        tx_outs = [TxOut(2**64 - 1, Script()) for _ in range(input_index)] + [tx.tx_outs[input_index]]
+    else:
+        tx_outs = tx.tx_outs
+    copy = Tx(tx.version, tx_ins, tx_outs, tx.locktime)
+    return int.from_bytes(hash256(copy.serialize() + int_to_little_endian(hash_type, 4)), 'big')
+
+def bip143_sig_hash(tx, input_index, witness_script, hash_type):
+    '''the bip143 sighash, spelled out without any caching'''
+    base_type = hash_type & 0x1f
+    anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+    zero = bytes(32)
+    prevouts = b''.join(t.prev_tx[::-1] + int_to_little_endian(t.prev_index, 4) for t in tx.tx_ins)
+    sequences = b''.join(int_to_little_endian(t.sequence, 4) for t in tx.tx_ins)
+    if base_type == SIGHASH_SINGLE:
+        outputs = hash256(tx.tx_outs[input_index].serialize()) if input_index < len(tx.tx_outs) else zero
+    elif base_type == SIGHASH_NONE:
+        outputs = zero
+    else:
+        outputs = hash256(b''.join(t.serialize() for t in tx.tx_outs))
+    tx_in = tx.tx_ins[input_index]
+    s = int_to_little_endian(tx.version, 4)
+    s += zero if anyone_can_pay else hash256(prevouts)
+    s += zero if anyone_can_pay or base_type != SIGHASH_ALL else hash256(sequences)
+    s += tx_in.prev_tx[::-1] + int_to_little_endian(tx_in.prev_index, 4)
+    s += witness_script.serialize()
+    s += int_to_little_endian(tx_in.value(), 8)
+    s += int_to_little_endian(tx_in.sequence, 4)
+    s += outputs
+    s += int_to_little_endian(tx.locktime, 4) + int_to_little_endian(hash_type, 4)
+    return int.from_bytes(hash256(s), 'big')
+
 
 if __name__ == '__main__':
     TestCase.main()
\ No newline at end of file
@@ -0,0 +1,161 @@
+import mmap
+import os
+import threading
+from io import BytesIO
+from zlib import crc32
+
+from util import *
+
+
+class TxStore:
+    '''an append-only file of raw transactions, indexed by txid.
+
+    each record is the txid (32 bytes, as in Tx.hash()), the length of the
+    transaction (4 bytes), a crc32 of it (4 bytes) and the transaction itself.
+    records are only ever appended, so a crash can at worst leave a torn record
+    at the end, which is cut off the next time the file is opened. the index of
+    txid to offset is rebuilt on open by reading the file once, checking every
+    record against its crc32, and a transaction is only parsed when asked for.
+
+    a record that fails its check with a good record somewhere after it is
+    damage rather than a torn tail: it is left in the file but not indexed, its
+    offset goes to corrupt, and the scan carries on from the next record that
+    checks out, so a broken length field does not lose what follows. putting
+    the transaction again appends a good copy.'''
+
+    header_size = 40
+
+    def __init__(self, filename, sync=False):
+        self.filename = filename
+        self.sync = sync
+        self.index = {}
+        self.corrupt = []
+        self._lock = threading.Lock()
+        self._file = open(filename, 'a+b')
+        self._scan()
+
+    def __repr__(self):
+        return "TxStore({!r}, size={})".format(self.filename, len(self))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, txid):
+        return self._key(txid) in self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _key(txid):
+        # txids are accepted as hex, like TxFetcher uses, or as bytes
+        if type(txid) == str:
+            return bytes.fromhex(txid)
+        return bytes(txid)
+
+    def _record_size(self, header, raw):
+        # the size of a record, None if it is incomplete or fails its check
+        length = little_endian_to_int(header[32:36])
+        if len(header) != self.header_size or length == 0 or len(raw) != length \
+                or crc32(raw) != little_endian_to_int(header[36:40]):
+            return None
+        return self.header_size + length
+
+    def _next_record(self, start, end):
+        # the offset of the first good record at or after start, None if there is none
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for offset in range(start, end - self.header_size + 1):
+                header = m[offset:offset + self.header_size]
+                length = little_endian_to_int(header[32:36])
+                raw_start = offset + self.header_size
+                if raw_start + length <= end and self._record_size(header, m[raw_start:raw_start + length]):
+                    return offset
+        return None
+
+    def _scan(self):
+        f = self._file
+        end = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        offset = 0
+        while offset < end:
+            f.seek(offset)
+            header = f.read(self.header_size)
+            # a damaged length can be anything, so never read past the end
+            length = little_endian_to_int(header[32:36])
+            size = self._record_size(header, f.read(max(0, min(length, end - offset - self.header_size))))
+            if size is not None:
+                self.index[header[:32]] = offset
+                offset += size
+                continue
+            resume = self._next_record(offset + 1, end)
+            if resume is None:
+                # nothing good follows, so it was being written when the
+                # process died
+                f.truncate(offset)
+                f.flush()
+                break
+            self.corrupt.append(offset)
+            offset = resume
+
+    def _header(self, offset):
+        self._file.seek(offset)
+        return self._file.read(self.header_size)
+
+    def _read(self, offset):
+        # the raw transaction at offset, None if its checksum does not match
+        header = self._header(offset)
+        length = little_endian_to_int(header[32:36])
+        raw = self._file.read(length)
+        if len(raw) != length or crc32(raw) != little_endian_to_int(header[36:40]):
+            return None
+        return raw
+
+    def get_raw(self, txid):
+        '''the serialized transaction, None if it is not in the store'''
+        key = self._key(txid)
+        with self._lock:
+            offset = self.index.get(key)
+            if offset is None:
+                return None
+            raw = self._read(offset)
+        if raw is None:
+            raise RuntimeError('corrupt record for {} in {}'.format(key.hex(), self.filename))
+        return raw
+
+    def get(self, txid, testnet=False):
+        '''the Tx, None if it is not in the store'''
+        # transaction imports this module, so import it late
+        from transaction import Tx
+
+        raw = self.get_raw(txid)
+        if raw is None:
+            return None
+        return Tx.parse(BytesIO(raw), testnet=testnet)
+
+    def put_raw(self, txid, raw):
+        key = self._key(txid)
+        record = key + int_to_little_endian(len(raw), 4) + int_to_little_endian(crc32(raw), 4) + raw
+        with self._lock:
+            if key in self.index:
+                return
+            f = self._file
+            offset = f.seek(0, os.SEEK_END)
+            f.write(record)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+            self.index[key] = offset
+
+    def put(self, tx):
+        '''appends a Tx, unless it is already stored'''
+        self.put_raw(tx.hash(), tx.serialize())
+
+    def txids(self):
+        return [key.hex() for key in self.index]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
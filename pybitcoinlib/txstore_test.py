@@ -0,0 +1,133 @@
+import os
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+
+from txstore import *
+from transaction import TxFetcher
+
+class TxStoreTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        TxFetcher.load_cache('../tx.cache')
+
+    def test_put_get(self):
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'tx.store')
+            with TxStore(filename) as store:
+                for tx in TxFetcher.cache.values():
+                    store.put(tx)
+                    store.put(tx)
+                self.assertEqual(len(store), len(TxFetcher.cache))
+            # a fresh store only knows the offsets until something is read
+            with TxStore(filename) as store:
+                self.assertEqual(sorted(store.txids()), sorted(TxFetcher.cache))
+                for txid, tx in TxFetcher.cache.items():
+                    self.assertIn(txid, store)
+                    self.assertEqual(store.get(txid).serialize(), tx.serialize())
+                self.assertIsNone(store.get('00' * 32))
+
+    def test_torn_tail(self):
+        txs = list(TxFetcher.cache.values())[:3]
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'tx.store')
+            with TxStore(filename) as store:
+                for tx in txs:
+                    store.put(tx)
+            size = os.path.getsize(filename)
+            # half a record, as if the process died while writing it
+            with open(filename, 'ab') as f:
+                f.write(txs[0].hash()[::-1] + b'\xff\x00')
+            with TxStore(filename) as store:
+                self.assertEqual(len(store), 3)
+            self.assertEqual(os.path.getsize(filename), size)
+            # a last record whose bytes did not all make it to disk
+            with open(filename, 'r+b') as f:
+                f.seek(size - 1)
+                f.write(b'\x00' if txs[2].serialize()[-1] else b'\x01')
+            with TxStore(filename) as store:
+                self.assertEqual(len(store), 2)
+                self.assertNotIn(txs[2].id(), store)
+                store.put(txs[2])
+            with TxStore(filename) as store:
+                self.assertEqual(store.get(txs[2].id()).id(), txs[2].id())
+
+    def test_corrupt_record(self):
+        txs = list(TxFetcher.cache.values())[:3]
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'tx.store')
+            with TxStore(filename) as store:
+                for tx in txs:
+                    store.put(tx)
+                offset = store.index[txs[1].hash()]
+            size = os.path.getsize(filename)
+            # a flipped byte in the middle of the file
+            with open(filename, 'r+b') as f:
+                f.seek(offset + store.header_size + 10)
+                byte = f.read(1)
+                f.seek(-1, 1)
+                f.write(bytes([byte[0] ^ 1]))
+            with TxStore(filename) as store:
+                self.assertEqual(store.corrupt, [offset])
+                self.assertNotIn(txs[1].id(), store)
+                self.assertEqual(store.get(txs[2].id()).id(), txs[2].id())
+                # nothing after it is lost, and it can be put again
+                self.assertEqual(os.path.getsize(filename), size)
+                store.put(txs[1])
+            with TxStore(filename) as store:
+                self.assertEqual(store.get(txs[1].id()).id(), txs[1].id())
+
+    def test_corrupt_length(self):
+        txs = list(TxFetcher.cache.values())[:3]
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'tx.store')
+            with TxStore(filename) as store:
+                for tx in txs:
+                    store.put(tx)
+                offset = store.index[txs[1].hash()]
+            size = os.path.getsize(filename)
+            length = len(txs[1].serialize())
+            # a length pointing inside the next record, and one past the end
+            for bad_length in (length + 7, 2 ** 32 - 1):
+                with open(filename, 'r+b') as f:
+                    f.seek(offset + 32)
+                    f.write(int_to_little_endian(bad_length, 4))
+                with TxStore(filename) as store:
+                    self.assertEqual(store.corrupt, [offset])
+                    self.assertNotIn(txs[1].id(), store)
+                    self.assertEqual(store.get(txs[0].id()).id(), txs[0].id())
+                    self.assertEqual(store.get(txs[2].id()).id(), txs[2].id())
+                self.assertEqual(os.path.getsize(filename), size)
+            with TxStore(filename) as store:
+                store.put(txs[1])
+            with TxStore(filename) as store:
+                self.assertEqual(len(store), 3)
+                self.assertEqual(store.get(txs[1].id()).id(), txs[1].id())
+
+    def test_fetcher(self):
+        tx = list(TxFetcher.cache.values())[0]
+        txid = tx.id()
+        store_filename = TxFetcher.store_filename
+        # there is no store until one is asked for
+        self.assertIsNone(TxFetcher.store_filename)
+        self.assertIsNone(TxFetcher.get_store())
+        with TemporaryDirectory() as tmp:
+            try:
+                TxFetcher.open_store(os.path.join(tmp, 'tx.store'))
+                TxFetcher.dump_store()
+                TxFetcher.close_store()
+                del TxFetcher.cache[txid]
+                # the store is opened again when needed, and the transaction
+                # comes back from it without going online
+                self.assertEqual(TxFetcher.fetch(txid).serialize(), tx.serialize())
+                self.assertIn(txid, TxFetcher.cache)
+                TxFetcher.close_store()
+                # a store file can be loaded like a tx.cache
+                del TxFetcher.cache[txid]
+                TxFetcher.load_cache(os.path.join(tmp, 'tx.store'))
+                self.assertIsNotNone(TxFetcher.store)
+                self.assertEqual(TxFetcher.fetch(txid).id(), txid)
+            finally:
+                TxFetcher.close_store()
+                TxFetcher.store_filename = store_filename
+                TxFetcher.cache[txid] = tx
@@ -0,0 +1,192 @@
+from array import array
+from bisect import bisect_right
+from io import BytesIO
+
+from util import *
+from script import Script
+from transaction import Tx, TxIn, TxOut
+
+
+P2PKH = 'p2pkh'
+P2SH = 'p2sh'
+P2WPKH = 'p2wpkh'
+P2WSH = 'p2wsh'
+OTHER = 'other'
+
+
+def script_type(raw):
+    '''the kind of a ScriptPubKey, from its raw bytes (without the length prefix)'''
+    length = len(raw)
+    if length == 25 and raw[0] == 0x76 and raw[1] == 0xa9 and raw[2] == 20 \
+            and raw[23] == 0x88 and raw[24] == 0xac:
+        return P2PKH
+    if length == 23 and raw[0] == 0xa9 and raw[1] == 20 and raw[22] == 0x87:
+        return P2SH
+    if length == 22 and raw[0] == 0 and raw[1] == 20:
+        return P2WPKH
+    if length == 34 and raw[0] == 0 and raw[1] == 32:
+        return P2WSH
+    return OTHER
+
+
+class TxTable:
+    '''many transactions stored column by column in arrays and bytearrays,
+    instead of one Tx, TxIn, TxOut and Script object each.
+
+    transaction i owns inputs tx_in_starts[i]:tx_in_starts[i + 1] and outputs
+    tx_out_starts[i]:tx_out_starts[i + 1]. scripts and witnesses are byte ranges
+    of one shared bytearray, input or output j's script being
+    data[script_starts[j]:script_starts[j + 1]].'''
+
+    def __init__(self):
+        # per transaction
+        self.txids = bytearray()
+        self.versions = array('I')
+        self.locktimes = array('I')
+        self.segwit = bytearray()
+        self.tx_in_starts = array('Q', [0])
+        self.tx_out_starts = array('Q', [0])
+        # per input
+        self.prev_txs = bytearray()
+        self.prev_indexes = array('I')
+        self.sequences = array('I')
+        self.script_sig_starts = array('Q', [0])
+        self.witness_starts = array('Q', [0])
+        # per output
+        self.amounts = array('Q')
+        self.script_pubkey_starts = array('Q', [0])
+        # script_sigs, serialized witnesses and script_pubkeys
+        self.script_sigs = bytearray()
+        self.witnesses = bytearray()
+        self.script_pubkeys = bytearray()
+
+    def __repr__(self):
+        return "TxTable(txs={}, inputs={}, outputs={})".format(
+            len(self), len(self.prev_indexes), len(self.amounts))
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.tx(i)
+
+    @classmethod
+    def from_txs(cls, txs):
+        table = cls()
+        table.extend(txs)
+        return table
+
+    def extend(self, txs):
+        for tx in txs:
+            self.append(tx)
+
+    def append(self, tx):
+        '''adds the columns of a Tx'''
+        self.txids += tx.hash()
+        self.versions.append(tx.version)
+        self.locktimes.append(tx.locktime)
+        self.segwit.append(1 if tx.segwit else 0)
+
+        for tx_in in tx.tx_ins:
+            self.prev_txs += tx_in.prev_tx
+            self.prev_indexes.append(tx_in.prev_index)
+            self.sequences.append(tx_in.sequence)
+            self.script_sigs += tx_in.script_sig.raw_serialize()
+            self.script_sig_starts.append(len(self.script_sigs))
+            if tx.segwit:
+                self.witnesses += encode_varint(len(tx_in.witness))
+                for item in tx_in.witness:
+                    if type(item) == int:
+                        self.witnesses += int_to_little_endian(item, 1)
+                    else:
+                        self.witnesses += encode_varint(len(item)) + item
+            self.witness_starts.append(len(self.witnesses))
+        self.tx_in_starts.append(len(self.prev_indexes))
+
+        for tx_out in tx.tx_outs:
+            self.amounts.append(tx_out.amount)
+            self.script_pubkeys += tx_out.script_pubkey.raw_serialize()
+            self.script_pubkey_starts.append(len(self.script_pubkeys))
+        self.tx_out_starts.append(len(self.amounts))
+
+    def txid(self, i):
+        return bytes(self.txids[32 * i:32 * (i + 1)])
+
+    def script_sig(self, j):
+        '''raw bytes of input j's ScriptSig'''
+        return bytes(self.script_sigs[self.script_sig_starts[j]:self.script_sig_starts[j + 1]])
+
+    def script_pubkey(self, j):
+        '''raw bytes of output j's ScriptPubKey'''
+        return bytes(self.script_pubkeys[self.script_pubkey_starts[j]:self.script_pubkey_starts[j + 1]])
+
+    def witness(self, j):
+        '''the witness items of input j, as TxIn.witness holds them'''
+        start, end = self.witness_starts[j], self.witness_starts[j + 1]
+        items = []
+        if start == end:
+            return items
+        s = BytesIO(self.witnesses[start:end])
+        for _ in range(read_varint(s)):
+            item_len = read_varint(s)
+            if item_len == 0:
+                items.append(0)
+            else:
+                items.append(s.read(item_len))
+        return items
+
+    def tx(self, i):
+        '''builds the Tx stored at index i'''
+        segwit = self.segwit[i] == 1
+        tx_ins = []
+        for j in range(self.tx_in_starts[i], self.tx_in_starts[i + 1]):
+            tx_in = TxIn(bytes(self.prev_txs[32 * j:32 * (j + 1)]), self.prev_indexes[j],
+                         Script.from_raw(self.script_sig(j)), self.sequences[j])
+            if segwit:
+                tx_in.witness = self.witness(j)
+            tx_ins.append(tx_in)
+        tx_outs = []
+        for j in range(self.tx_out_starts[i], self.tx_out_starts[i + 1]):
+            tx_outs.append(TxOut(self.amounts[j], Script.from_raw(self.script_pubkey(j))))
+        return Tx(self.versions[i], tx_ins, tx_outs, self.locktimes[i], segwit=segwit)
+
+    def output_tx(self, j):
+        '''index of the transaction that output j belongs to'''
+        return bisect_right(self.tx_out_starts, j) - 1
+
+    def input_tx(self, j):
+        '''index of the transaction that input j belongs to'''
+        return bisect_right(self.tx_in_starts, j) - 1
+
+    def outpoints(self):
+        '''(txid, index) of every output, in order'''
+        for i in range(len(self)):
+            txid = self.txid(i)
+            for index in range(self.tx_out_starts[i + 1] - self.tx_out_starts[i]):
+                yield txid, index
+
+    def script_types(self):
+        '''the script_type of every output, in order'''
+        starts = self.script_pubkey_starts
+        # a view, not copies; released before anything can grow the bytearray
+        with memoryview(self.script_pubkeys) as data:
+            return [script_type(data[starts[j]:starts[j + 1]]) for j in range(len(self.amounts))]
+
+    def filter_outputs(self, kind):
+        '''indexes of the outputs whose ScriptPubKey is of the given script_type'''
+        return [j for j, t in enumerate(self.script_types()) if t == kind]
+
+    def total_amount(self, outputs=None):
+        '''sum of the amounts of all outputs, or of the given output indexes'''
+        if outputs is None:
+            return sum(self.amounts)
+        amounts = self.amounts
+        return sum(amounts[j] for j in outputs)
+
+    def amounts_by_type(self):
+        '''total amount per script_type'''
+        totals = {}
+        for amount, kind in zip(self.amounts, self.script_types()):
+            totals[kind] = totals.get(kind, 0) + amount
+        return totals
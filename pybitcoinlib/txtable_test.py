@@ -0,0 +1,42 @@
+from unittest import TestCase
+from io import BytesIO
+from txtable import *
+from transaction import TxFetcher
+from script import p2wpkh_script
+
+class TxTableTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        TxFetcher.load_cache('../tx.cache')
+
+    def test_round_trip(self):
+        txs = list(TxFetcher.cache.values())
+        table = TxTable.from_txs(txs)
+        self.assertEqual(len(table), len(txs))
+        for i, tx in enumerate(txs):
+            self.assertEqual(table.txid(i), tx.hash())
+            self.assertEqual(table.tx(i).serialize(), tx.serialize())
+        self.assertEqual([tx.id() for tx in table], [tx.id() for tx in txs])
+        # a segwit transaction keeps its witnesses
+        tx_in = TxIn(bytes(32), 1, witness=[bytes(71), 0, bytes(33)])
+        tx = Tx(2, [tx_in], [TxOut(1000, p2wpkh_script(bytes(20)))], 0, segwit=True)
+        table.append(tx)
+        self.assertEqual(table.tx(len(txs)).serialize(), tx.serialize())
+        self.assertEqual(table.input_tx(len(table.prev_indexes) - 1), len(txs))
+
+    def test_columns(self):
+        txs = list(TxFetcher.cache.values())
+        table = TxTable.from_txs(txs)
+        outputs = [tx_out for tx in txs for tx_out in tx.tx_outs]
+        self.assertEqual(table.total_amount(), sum(tx_out.amount for tx_out in outputs))
+        p2pkh = table.filter_outputs(P2PKH)
+        want = [j for j, tx_out in enumerate(outputs) if tx_out.script_pubkey.is_p2pkh_script_pubkey()]
+        self.assertEqual(p2pkh, want)
+        self.assertEqual(table.total_amount(p2pkh), sum(outputs[j].amount for j in want))
+        self.assertEqual(sum(table.amounts_by_type().values()), table.total_amount())
+        self.assertEqual(table.output_tx(0), 0)
+        self.assertEqual(table.output_tx(len(outputs) - 1), len(txs) - 1)
+        outpoints = list(table.outpoints())
+        self.assertEqual(len(outpoints), len(outputs))
+        self.assertEqual(outpoints[-1], (txs[-1].hash(), len(txs[-1].tx_outs) - 1))
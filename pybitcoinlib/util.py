@@ -3,6 +3,7 @@ from base58 import *
 SIGHASH_ALL = 1
 SIGHASH_NONE = 2
 SIGHASH_SINGLE = 3
+SIGHASH_ANYONECANPAY = 0x80
 
 TWO_WEEKS = 60 * 60 * 24 * 14
 MAX_TARGET = 0xffff * 256**(0x1d - 3)
@@ -33,6 +34,20 @@ def read_varint(s):
     else:
         return i
 
+def read_varint_buffer(b, offset):
+    '''read a variable integer from a buffer at offset,
+    returns it and the offset right after it'''
+    i = b[offset]
+
+    if i == 0xfd:
+        return int.from_bytes(b[offset + 1:offset + 3], "little"), offset + 3
+    elif i == 0xfe:
+        return int.from_bytes(b[offset + 1:offset + 5], "little"), offset + 5
+    elif i == 0xff:
+        return int.from_bytes(b[offset + 1:offset + 9], "little"), offset + 9
+    else:
+        return i, offset + 1
+
 def encode_varint(i):
     '''encode an int as a varint'''
 
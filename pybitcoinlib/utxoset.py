@@ -0,0 +1,234 @@
+import sqlite3
+
+from util import *
+from cache import LRUCache
+
+
+def outpoint_key(txid, vout):
+    '''the compact key of an output: the txid (as in TxIn.prev_tx) followed by
+    the output index as a varint, 33 bytes for almost every output'''
+    return bytes(txid) + encode_varint(vout)
+
+
+def encode_coin(amount, script_pubkey, height=0, coinbase=False):
+    '''varint amount, varint height * 2 + coinbase flag, then the raw script_pubkey'''
+    return encode_varint(amount) + encode_varint(height * 2 + (1 if coinbase else 0)) + bytes(script_pubkey)
+
+
+def decode_coin(value):
+    '''(amount, raw script_pubkey, height, coinbase) of an encoded coin'''
+    amount, offset = read_varint_buffer(value, 0)
+    code, offset = read_varint_buffer(value, offset)
+    return amount, bytes(value[offset:]), code >> 1, code & 1 == 1
+
+
+def _encode_items(items):
+    result = encode_varint(len(items))
+    for item in items:
+        result += encode_varint(len(item)) + item
+    return result
+
+
+def _decode_items(b, offset):
+    count, offset = read_varint_buffer(b, offset)
+    items = []
+    for _ in range(count):
+        length, offset = read_varint_buffer(b, offset)
+        items.append(bytes(b[offset:offset + length]))
+        offset += length
+    return items, offset
+
+
+class UtxoSet:
+    '''the unspent outputs of a chain of blocks, kept in a sqlite file.
+
+    connect_block spends the inputs and adds the outputs of a block's
+    transactions, and keeps undo data (the outputs it created and the coins it
+    spent) so that disconnect_block can take back the last max_undo blocks.
+
+    reads and writes go through an LRU cache of encoded coins. changes are
+    written back when their entry is evicted or on flush, and only flush
+    commits, so the file always holds the set as of some flushed block. an
+    output that is created and spent between two flushes never reaches the
+    file.'''
+
+    def __init__(self, filename, cache_size=100000, max_undo=100):
+        self.filename = filename
+        self.max_undo = max_undo
+        self.db = sqlite3.connect(filename)
+        self.db.execute('CREATE TABLE IF NOT EXISTS utxo (key BLOB PRIMARY KEY, coin BLOB NOT NULL) WITHOUT ROWID')
+        self.db.execute('CREATE TABLE IF NOT EXISTS undo (height INTEGER PRIMARY KEY, hash BLOB, prev_hash BLOB, data BLOB)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS tip (id INTEGER PRIMARY KEY CHECK (id = 0), height INTEGER, hash BLOB)')
+        self.db.commit()
+        row = self.db.execute('SELECT height, hash FROM tip').fetchone()
+        if row is None:
+            self.height, self.tip = -1, None
+        else:
+            self.height, self.tip = row
+        # key -> encoded coin, or None for an output known to be unspendable
+        self.cache = LRUCache(cache_size, on_evict=self._evicted)
+        # changes not written to the file yet, None meaning deleted
+        self._dirty = {}
+        # dirty keys with no row in the file, which can be dropped when spent
+        self._fresh = set()
+
+    def __repr__(self):
+        return "UtxoSet({!r}, height={})".format(self.filename, self.height)
+
+    def __contains__(self, outpoint):
+        return self._get(outpoint_key(*outpoint)) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _evicted(self, key, value):
+        if key in self._dirty:
+            self._write(key, self._dirty.pop(key))
+            self._fresh.discard(key)
+
+    def _write(self, key, value):
+        if value is None:
+            self.db.execute('DELETE FROM utxo WHERE key = ?', (key,))
+        else:
+            self.db.execute('INSERT OR REPLACE INTO utxo VALUES (?, ?)', (key, value))
+
+    def _get(self, key):
+        if key in self._dirty:
+            return self._dirty[key]
+        value = self.cache.get(key, False)
+        if value is False:
+            row = self.db.execute('SELECT coin FROM utxo WHERE key = ?', (key,)).fetchone()
+            value = None if row is None else row[0]
+            self.cache.put(key, value)
+        return value
+
+    def _in_file(self, key):
+        # whether the file has a row for a key with no pending change
+        value = self.cache.get(key, False)
+        if value is False:
+            return self.db.execute('SELECT 1 FROM utxo WHERE key = ?', (key,)).fetchone() is not None
+        return value is not None
+
+    def _set(self, key, value):
+        if value is None and key in self._fresh:
+            # it never made it to the file, so there is nothing to delete
+            del self._dirty[key]
+            self._fresh.discard(key)
+        else:
+            # fresh only once the file is known to have no row for it, otherwise
+            # an output added again (a duplicate txid, a block connected again
+            # after a flush) would leave the old row behind when spent
+            if value is not None and key not in self._dirty and not self._in_file(key):
+                self._fresh.add(key)
+            self._dirty[key] = value
+        self.cache.put(key, value)
+
+    def get(self, txid, vout):
+        '''(amount, raw script_pubkey) of an unspent output, None if there is none'''
+        coin = self.coin(txid, vout)
+        if coin is None:
+            return None
+        return coin[:2]
+
+    def coin(self, txid, vout):
+        '''(amount, raw script_pubkey, height, coinbase) of an unspent output'''
+        value = self._get(outpoint_key(txid, vout))
+        if value is None:
+            return None
+        return decode_coin(value)
+
+    def add(self, txid, vout, amount, script_pubkey, height=0, coinbase=False):
+        self._set(outpoint_key(txid, vout), encode_coin(amount, script_pubkey, height, coinbase))
+
+    def spend(self, txid, vout):
+        '''removes an output and returns its encoded coin, raises ValueError if
+        it is not in the set'''
+        key = outpoint_key(txid, vout)
+        value = self._get(key)
+        if value is None:
+            raise ValueError('{}:{} is not an unspent output'.format(bytes(txid).hex(), vout))
+        self._set(key, None)
+        return value
+
+    def _undo(self, created, spent):
+        # coins come back before created outputs go, so an output created and
+        # spent in the same block ends up gone
+        for key, value in reversed(spent):
+            self._set(key, value)
+        for key in created:
+            if self._get(key) is not None:
+                self._set(key, None)
+
+    def connect_block(self, block, txs, height=None):
+        '''applies the transactions of block, which must build on the tip.
+        txs can be a generator such as block.iter_txs(s). height is only needed
+        for the first block, later ones follow the tip. if an input spends an
+        unknown output, the block's changes are taken back and ValueError is
+        raised'''
+        if self.tip is not None:
+            if block.prev_block != self.tip:
+                raise ValueError('block {} does not build on the tip {}'.format(
+                    block.hash().hex(), self.tip.hex()))
+            height = self.height + 1
+        elif height is None:
+            height = 0
+        created = []
+        spent = []
+        try:
+            for tx in txs:
+                coinbase = tx.is_coinbase()
+                if not coinbase:
+                    for tx_in in tx.tx_ins:
+                        key = outpoint_key(tx_in.prev_tx, tx_in.prev_index)
+                        spent.append((key, self.spend(tx_in.prev_tx, tx_in.prev_index)))
+                txid = tx.hash()
+                for vout, tx_out in enumerate(tx.tx_outs):
+                    script_pubkey = tx_out.script_pubkey.raw_serialize()
+                    # OP_RETURN outputs can never be spent
+                    if script_pubkey[:1] == b'\x6a':
+                        continue
+                    key = outpoint_key(txid, vout)
+                    self._set(key, encode_coin(tx_out.amount, script_pubkey, height, coinbase))
+                    created.append(key)
+        except Exception:
+            self._undo(created, spent)
+            raise
+
+        data = _encode_items(created) + _encode_items([key for key, _ in spent]) \
+            + _encode_items([value for _, value in spent])
+        self.db.execute('INSERT OR REPLACE INTO undo VALUES (?, ?, ?, ?)',
+                        (height, block.hash(), block.prev_block, data))
+        self.db.execute('DELETE FROM undo WHERE height <= ?', (height - self.max_undo,))
+        self.height, self.tip = height, block.hash()
+
+    def disconnect_block(self):
+        '''takes back the last connected block and returns its hash, raises
+        ValueError if there is no undo data left for it'''
+        row = self.db.execute('SELECT hash, prev_hash, data FROM undo WHERE height = ?',
+                              (self.height,)).fetchone()
+        if row is None or row[0] != self.tip:
+            raise ValueError('no undo data for block at height {}'.format(self.height))
+        block_hash, prev_hash, data = row
+        created, offset = _decode_items(data, 0)
+        keys, offset = _decode_items(data, offset)
+        values, offset = _decode_items(data, offset)
+        self._undo(created, list(zip(keys, values)))
+        self.db.execute('DELETE FROM undo WHERE height = ?', (self.height,))
+        self.height, self.tip = self.height - 1, prev_hash
+        return block_hash
+
+    def flush(self):
+        '''writes every change back and commits, together with the tip'''
+        for key, value in self._dirty.items():
+            self._write(key, value)
+        self._dirty.clear()
+        self._fresh.clear()
+        self.db.execute('INSERT OR REPLACE INTO tip VALUES (0, ?, ?)', (self.height, self.tip))
+        self.db.commit()
+
+    def close(self):
+        self.flush()
+        self.db.close()
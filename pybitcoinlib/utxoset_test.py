@@ -0,0 +1,146 @@
+import os
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+
+from utxoset import *
+from block import Block
+from script import Script, p2pkh_script
+from transaction import Tx, TxIn, TxOut, TxFetcher
+
+def coinbase(height, amount):
+    tx_in = TxIn(bytes(32), 0xffffffff, Script([int_to_little_endian(height, 2)]))
+    return Tx(1, [tx_in], [TxOut(amount, p2pkh_script(bytes([height]) * 20))], 0)
+
+def spend(tx, vout, amounts):
+    tx_outs = [TxOut(amount, p2pkh_script(bytes([i]) * 20)) for i, amount in enumerate(amounts)]
+    return Tx(1, [TxIn(tx.hash(), vout)], tx_outs, 0)
+
+def header(prev_block, nonce):
+    return Block(1, prev_block, bytes(32), 0, bytes(4), bytes([nonce]) * 4)
+
+class UtxoSetTest(TestCase):
+
+    def setUp(self):
+        # two blocks: the second spends the first coinbase, and spends one of
+        # the outputs of that spend again, and has an OP_RETURN output
+        self.coinbase1 = coinbase(1, 5000)
+        self.block1 = header(bytes(32), 1)
+        self.coinbase2 = coinbase(2, 5000)
+        self.tx = spend(self.coinbase1, 0, [3000, 2000])
+        self.tx.tx_outs.append(TxOut(0, Script([0x6a, b'hello'])))
+        self.child = spend(self.tx, 0, [2900])
+        self.block2 = header(self.block1.hash(), 2)
+        self.txs2 = [self.coinbase2, self.tx, self.child]
+
+    def test_encoding(self):
+        self.assertEqual(len(outpoint_key(bytes(32), 1)), 33)
+        self.assertEqual(len(outpoint_key(bytes(32), 300)), 35)
+        coin = encode_coin(5000, b'\x51', 7, True)
+        self.assertEqual(decode_coin(coin), (5000, b'\x51', 7, True))
+
+    def test_connect_disconnect(self):
+        with TemporaryDirectory() as tmp:
+            with UtxoSet(os.path.join(tmp, 'utxo')) as utxos:
+                utxos.connect_block(self.block1, [self.coinbase1], height=1)
+                self.assertEqual(utxos.coin(self.coinbase1.hash(), 0),
+                                 (5000, self.coinbase1.tx_outs[0].script_pubkey.raw_serialize(), 1, True))
+                utxos.connect_block(self.block2, iter(self.txs2))
+                self.assertEqual((utxos.height, utxos.tip), (2, self.block2.hash()))
+                self.assertIsNone(utxos.get(self.coinbase1.hash(), 0))
+                self.assertIsNone(utxos.get(self.tx.hash(), 0))
+                self.assertEqual(utxos.get(self.tx.hash(), 1)[0], 2000)
+                self.assertNotIn((self.tx.hash(), 2), utxos)
+                self.assertEqual(utxos.coin(self.child.hash(), 0)[2:], (2, False))
+
+                self.assertEqual(utxos.disconnect_block(), self.block2.hash())
+                self.assertEqual((utxos.height, utxos.tip), (1, self.block1.hash()))
+                self.assertEqual(utxos.get(self.coinbase1.hash(), 0)[0], 5000)
+                for tx in self.txs2:
+                    self.assertNotIn((tx.hash(), 0), utxos)
+                self.assertNotIn((self.tx.hash(), 1), utxos)
+                # and again, now that it fits the tip
+                utxos.connect_block(self.block2, self.txs2)
+                self.assertIn((self.child.hash(), 0), utxos)
+
+    def test_bad_block(self):
+        with TemporaryDirectory() as tmp:
+            with UtxoSet(os.path.join(tmp, 'utxo')) as utxos:
+                utxos.connect_block(self.block1, [self.coinbase1])
+                # does not build on block1
+                with self.assertRaises(ValueError):
+                    utxos.connect_block(header(bytes(32), 3), self.txs2)
+                # spends an output that does not exist, after spending coinbase1
+                bad = spend(self.coinbase1, 1, [1])
+                with self.assertRaises(ValueError):
+                    utxos.connect_block(self.block2, [self.coinbase2, self.tx, bad])
+                self.assertEqual(utxos.tip, self.block1.hash())
+                self.assertIn((self.coinbase1.hash(), 0), utxos)
+                self.assertNotIn((self.coinbase2.hash(), 0), utxos)
+                self.assertNotIn((self.tx.hash(), 1), utxos)
+
+    def test_write_back(self):
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'utxo')
+            # a cache of one entry writes nearly everything back on eviction
+            utxos = UtxoSet(filename, cache_size=1, max_undo=1)
+            utxos.connect_block(self.block1, [self.coinbase1])
+            utxos.connect_block(self.block2, self.txs2)
+            utxos.close()
+
+            with UtxoSet(filename) as utxos:
+                self.assertEqual((utxos.height, utxos.tip), (1, self.block2.hash()))
+                self.assertIsNone(utxos.get(self.coinbase1.hash(), 0))
+                self.assertEqual(utxos.get(self.child.hash(), 0)[0], 2900)
+                rows = utxos.db.execute('SELECT COUNT(*) FROM utxo').fetchone()[0]
+                self.assertEqual(rows, 3)
+
+            # changes that were never flushed are lost, not half written
+            utxos = UtxoSet(filename)
+            utxos.disconnect_block()
+            self.assertEqual(utxos.get(self.coinbase1.hash(), 0)[0], 5000)
+            utxos.db.close()
+
+            with UtxoSet(filename) as utxos:
+                self.assertEqual(utxos.tip, self.block2.hash())
+                self.assertIsNone(utxos.get(self.coinbase1.hash(), 0))
+                utxos.disconnect_block()
+                self.assertEqual(utxos.get(self.coinbase1.hash(), 0)[0], 5000)
+                # only the last block can be taken back
+                with self.assertRaises(ValueError):
+                    utxos.disconnect_block()
+
+    def test_add_over_flushed(self):
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'utxo')
+            txid = bytes(32)
+            with UtxoSet(filename) as utxos:
+                utxos.add(txid, 0, 5, b'Q')
+                utxos.flush()
+                # the row is on disk now, so spending it again must delete it
+                utxos.add(txid, 0, 6, b'Q')
+                utxos.spend(txid, 0)
+                utxos.flush()
+                self.assertIsNone(utxos.get(txid, 0))
+            with UtxoSet(filename) as utxos:
+                self.assertIsNone(utxos.get(txid, 0))
+            # the same after the row was evicted from the cache
+            with UtxoSet(filename, cache_size=1) as utxos:
+                utxos.add(txid, 0, 5, b'Q')
+                utxos.flush()
+                utxos.add(bytes(31) + b'\x01', 0, 1, b'Q')
+                utxos.add(txid, 0, 6, b'Q')
+                utxos.spend(txid, 0)
+            with UtxoSet(filename) as utxos:
+                self.assertIsNone(utxos.get(txid, 0))
+
+    def test_fetcher(self):
+        with TemporaryDirectory() as tmp:
+            try:
+                utxos = TxFetcher.open_utxo_set(os.path.join(tmp, 'utxo'))
+                utxos.connect_block(self.block1, [self.coinbase1])
+                tx_in = TxIn(self.coinbase1.hash(), 0)
+                self.assertEqual(tx_in.value(), 5000)
+                self.assertEqual(tx_in.script_pubkey().raw_serialize(),
+                                 self.coinbase1.tx_outs[0].script_pubkey.raw_serialize())
+            finally:
+                TxFetcher.close_utxo_set()